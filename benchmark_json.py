@@ -0,0 +1,65 @@
+
+
+import sys
+import time
+import json
+import argparse
+from pathlib import Path
+
+from pdf_content_extractor import JSONSerializer, ORJSON_AVAILABLE, MSGSPEC_AVAILABLE
+
+def load_pages(path, repeat):
+    """Load a raw_pages.json file and replicate its pages to simulate a longer paper."""
+    with open(path, 'r', encoding='utf-8') as f:
+        pages = json.load(f)
+
+    return [dict(page, page_number=i * len(pages) + page["page_number"])
+            for i in range(repeat) for page in pages]
+
+def time_backend(serializer, pages, rounds):
+    """Return the best serialization time in seconds and the output size in bytes."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        encoded = serializer.dumps(pages)
+        best = min(best, time.perf_counter() - start)
+
+    return best, len(encoded)
+
+def main():
+    """Compare the JSON backends on a raw_pages.json file."""
+    parser = argparse.ArgumentParser(description="Benchmark the JSON serializer backends")
+    parser.add_argument("raw_pages", help="Path to a raw_pages.json file")
+    parser.add_argument("--repeat", type=int, default=100,
+                        help="Replicate the pages this many times (default: 100)")
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="Timed rounds per backend; the best is reported (default: 5)")
+    args = parser.parse_args()
+
+    if not Path(args.raw_pages).exists():
+        print(f"File not found: {args.raw_pages}")
+        return 1
+
+    pages = load_pages(args.raw_pages, args.repeat)
+    print(f"Serializing {len(pages)} pages, best of {args.rounds} rounds\n")
+
+    backends = ["json"]
+    if ORJSON_AVAILABLE:
+        backends.append("orjson")
+    if MSGSPEC_AVAILABLE:
+        backends.append("msgspec")
+
+    baseline = None
+    print(f"{'backend':<10}{'layout':<10}{'time (ms)':>12}{'size (KB)':>12}{'speedup':>10}")
+    for backend in backends:
+        for compact in (False, True):
+            seconds, size = time_backend(JSONSerializer(backend, compact), pages, args.rounds)
+            if baseline is None:
+                baseline = seconds
+            layout = "compact" if compact else "indent"
+            print(f"{backend:<10}{layout:<10}{seconds * 1000:>12.1f}{size / 1024:>12.0f}{baseline / seconds:>9.1f}x")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,30 +1,149 @@
 
 
+import io
 import os
+import re
+import sys
+import bisect
 import json
+import base64
+import hashlib
+import glob
 import argparse
 import logging
+import signal
+import shutil
+import sqlite3
+import threading
+import time
+import atexit
+import importlib
+import importlib.util
+import multiprocessing
+import uuid
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, BinaryIO, Iterable, Iterator, Optional, Sequence, Tuple, Union
 
 
-try:
-    import fitz  
-    PYMUPDF_AVAILABLE = True
-except ImportError:
-    PYMUPDF_AVAILABLE = False
+class _LazyModule:
+    """
+    Stand-in for an optional dependency that is imported on first attribute
+    access, so a run only pays for the backends it uses. Availability is
+    checked with importlib.util.find_spec, which does not import anything.
+    """
+
+    def __init__(self, *names: str):
+        self._names = names
+        self._module = None
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        return self._names[0]
+
+    @property
+    def available(self) -> bool:
+        return any(importlib.util.find_spec(name.split(".")[0]) is not None for name in self._names)
+
+    def load(self):
+        """Import the first of the module names that is installed."""
+        if self._module is None:
+            start = time.perf_counter()
+            for name in self._names:
+                try:
+                    self._module = importlib.import_module(name)
+                    break
+                except ImportError:
+                    continue
+            else:
+                raise ImportError(f"No module named {self.name}")
+            self.load_seconds = time.perf_counter() - start
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+
+# PyMuPDF >= 1.24.3 installs as "pymupdf"; "fitz" is the older, deprecated name
+fitz = _LazyModule("pymupdf", "fitz")
+pdfplumber = _LazyModule("pdfplumber")
+Image = _LazyModule("PIL.Image")
+orjson = _LazyModule("orjson")
+msgspec = _LazyModule("msgspec")
+
+PYMUPDF_AVAILABLE = fitz.available
+PDFPLUMBER_AVAILABLE = pdfplumber.available
+PILLOW_AVAILABLE = Image.available
+ORJSON_AVAILABLE = orjson.available
+MSGSPEC_AVAILABLE = msgspec.available
+
+
+# Bump when a change alters extracted page data or parsed questions, so that
+# results cached by older versions are no longer served.
+EXTRACTOR_VERSION = 3
+PARSER_VERSION = 7
+
+# Non-blank line of a page text; group 1 spans the line without surrounding blanks
+_CONTENT_LINE_RE = re.compile(r"^[^\S\n]*(\S[^\n]*?)[^\S\n]*$", re.MULTILINE)
+
+# Line classifier for question parsing: a question number ("12."), an answer
+# line ("Ans [C]", "Ans. [D]") or an option marker ("[A]".."[D]")
+_LINE_TOKEN_RE = re.compile(r"(?P<number>\d{1,3})\.(?=\s|$)|(?P<answer>[Aa][Nn][Ss]\b)|(?P<option>\[[A-D]\])")
+
+def _round_box(box: Optional[Sequence[float]]) -> Optional[List[float]]:
+    """Round a bounding box for compact JSON output."""
+    return [round(value, 1) for value in box] if box else None
+
+
+# A PDF given by path or by its contents
+PDFSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
 
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
+def _read_pdf_source(source: PDFSource) -> Union[str, bytes]:
+    """Normalise a PDF source to a path string or the file contents."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        return source.read()
+    raise TypeError(f"Unsupported PDF source: {type(source).__name__}")
 
-try:
-    from PIL import Image
-    PILLOW_AVAILABLE = True
-except ImportError:
-    PILLOW_AVAILABLE = False
+
+def _source_name(source: Union[str, bytes]) -> str:
+    """Describe a normalised PDF source for log messages."""
+    return source if isinstance(source, str) else f"<{len(source)} bytes>"
+
+
+def _open_pymupdf(source: Union[str, bytes]):
+    """Open a normalised PDF source with PyMuPDF, from memory if it is not a path."""
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _file_digest(path: str) -> Optional[str]:
+    """Hash the contents of a file; None if it cannot be read."""
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+_DIGITS_RE = re.compile(r"\d+")
+_OBJECT_REF_RE = re.compile(r"\b(\d+) \d+ R\b")
+_OPTION_RE = re.compile(r"\[([A-D])\]")
+# "Ans [C]", "Ans. [D]", "Ans: B", "Ans (C)", "Ans - A"
+_ANSWER_RE = re.compile(r"[Aa][Nn][Ss]\.?\s*[:\-]?\s*[\[(]?\s*([A-D])\b")
 
 
 class PDFContentExtractor:
@@ -33,19 +152,88 @@ class PDFContentExtractor:
     from PDF files, specifically designed for educational content like math olympiad papers.
     """
 
-    def __init__(self, output_dir: str = "extracted_content"):
+    IMAGE_MODES = ("png", "raw")
+    OUTPUT_FORMATS = ("json", "jsonl")
+    OUTPUTS = ("disk", "memory")
+    MANIFEST_FILENAME = "manifest.json"
+
+    def __init__(self, output_dir: str = "extracted_content", image_mode: str = "png",
+                 image_writers: int = 2, write_queue_depth: int = 16,
+                 cache_dir: Optional[str] = None, cache_size_mb: int = 512,
+                 incremental: bool = False, strip_repeated: bool = False,
+                 compact_text: bool = False, output_format: str = "json", flush_every: int = 1,
+                 json_backend: str = "auto", compact_json: bool = False,
+                 image_store: Optional[str] = None, output: str = "disk"):
         """
         Initialize the PDF content extractor.
 
         Args:
             output_dir (str): Directory to save extracted images and JSON output
+            image_mode (str): "png" to re-encode every image as PNG, or "raw" to
+                keep the original encoded bytes where possible (PyMuPDF only)
+            image_writers (int): Background threads writing images to disk;
+                0 writes each image synchronously from the page loop
+            write_queue_depth (int): Maximum number of encoded images waiting
+                to be written, which bounds the memory held by the writer
+            cache_dir (Optional[str]): Directory of the persistent result cache;
+                None disables caching
+            cache_size_mb (int): Size limit of the result cache before the least
+                recently used entries are evicted
+            incremental (bool): Keep a page manifest in the output directory and
+                only re-extract pages that changed since the last run (PyMuPDF only)
+            strip_repeated (bool): Drop header/footer lines and images that repeat
+                across pages, such as page numbers and watermarks, before they
+                are saved or parsed (PyMuPDF only)
+            compact_text (bool): Collapse whitespace runs and blank lines in the
+                page text and join soft-wrapped lines before parsing
+            output_format (str): "json" for indented JSON arrays, or "jsonl" to
+                write questions and pages as JSON Lines (.jsonl) that can be read
+                while extraction is still running
+            flush_every (int): In jsonl mode, flush the file after this many
+                lines (and at least once a second)
+            json_backend (str): JSON library for the output files: "orjson",
+                "msgspec", "json", or "auto" for the fastest one installed
+            compact_json (bool): Write JSON without indentation or spaces
+            image_store (Optional[str]): Directory of a content-addressed image
+                store shared between extractions. Images are named by content
+                hash in two levels of subdirectories, and images already in the
+                store are referenced without being encoded again (PyMuPDF only)
+            output (str): "disk" to write images and JSON files to output_dir, or
+                "memory" to write nothing: the "images" of the page data then
+                hold file names, the encoded images are kept once per document
+                in image_data (file name -> bytes), and process_pdf only
+                returns the results
         """
+        if image_mode not in self.IMAGE_MODES:
+            raise ValueError(f"Unknown image mode: {image_mode}")
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        if output not in self.OUTPUTS:
+            raise ValueError(f"Unknown output: {output}")
+        if output == "memory" and (cache_dir or incremental or image_store):
+            raise ValueError("The result cache, incremental mode and the image store need output=\"disk\"")
+
         self.output_dir = Path(output_dir)
         self.images_dir = self.output_dir / "images"
+        self.image_mode = image_mode
+        self.image_writers = image_writers
+        self.write_queue_depth = write_queue_depth
+        self.cache = ExtractionCache(cache_dir, cache_size_mb * 1024 * 1024) if cache_dir else None
+        self.incremental = incremental
+        self.strip_repeated = strip_repeated
+        self.compact_text = compact_text
+        self.output_format = output_format
+        self.flush_every = flush_every
+        self.serializer = JSONSerializer(json_backend, compact_json)
+        self.image_store = Path(image_store).expanduser() if image_store else None
+        self.output = output
+        self.text_bytes_saved = 0
         self.extracted_data = []
+        self.image_data: Dict[str, bytes] = {}
 
         
-        self._create_directories()
+        if output == "disk":
+            self._create_directories()
 
         
         self._setup_logging()
@@ -61,23 +249,32 @@ class PDFContentExtractor:
 
     def _setup_logging(self):
         """Setup logging configuration."""
-        log_file = self.output_dir / "extraction.log"
+        handlers = [logging.StreamHandler()]
+        if self.output == "disk":
+            handlers.insert(0, logging.FileHandler(self.output_dir / "extraction.log"))
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler()
-            ]
+            handlers=handlers
         )
         self.logger = logging.getLogger(__name__)
 
-    def extract_with_pymupdf(self, pdf_path: str) -> List[Dict[str, Any]]:
+    def extract_with_pymupdf(self, pdf_path: PDFSource, workers: int = 1, pages: Optional[str] = None,
+                             sample: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Extract content using PyMuPDF (fitz) - fastest and most comprehensive.
 
+        In incremental mode the manifest left by the previous run is used to
+        reuse the text and images of pages whose fingerprint is unchanged.
+
         Args:
-            pdf_path (str): Path to the PDF file
+            pdf_path (PDFSource): Path to the PDF file, or its contents as bytes,
+                memoryview or a binary file object
+            workers (int): Number of worker processes; values above 1 split the
+                document into page ranges that are extracted in parallel
+            pages (Optional[str]): Page selection such as "1-5,20,40-" (1-based)
+            sample (Optional[int]): Only extract this many evenly spaced pages
+                of the selection
 
         Returns:
             List[Dict]: Extracted content organized by pages
@@ -85,39 +282,197 @@ class PDFContentExtractor:
         if not PYMUPDF_AVAILABLE:
             raise ImportError("PyMuPDF is not available. Install with: pip install PyMuPDF")
 
-        self.logger.info(f"Extracting content from {pdf_path} using PyMuPDF")
+        pdf_path = _read_pdf_source(pdf_path)
+        self.logger.info(f"Extracting content from {_source_name(pdf_path)} using PyMuPDF")
 
         try:
-            doc = fitz.open(pdf_path)
-            page_data = []
+            previous = self._load_manifest() if self.incremental else None
+            page_numbers = self._select_pymupdf_pages(pdf_path, pages, sample)
 
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
+            if workers > 1:
+                page_data, page_digests, fingerprints = self._extract_pymupdf_parallel(
+                    pdf_path, workers, page_numbers, previous)
+            else:
+                page_data, page_digests, fingerprints = self._extract_pymupdf_range(
+                    pdf_path, page_numbers, previous)
+
+            if self.incremental:
+                self._save_manifest(page_data, page_digests, fingerprints, previous,
+                                    partial=page_numbers is not None)
+
+            self.image_data = {}
+            for page_info in page_data:
+                self.image_data.update(page_info.pop("image_data", {}))
+
+            self.logger.info(f"Successfully extracted content from {len(page_data)} pages")
+            return page_data
+
+        except Exception as e:
+            self.logger.error(f"Error extracting with PyMuPDF: {e}")
+            raise
+
+    @staticmethod
+    def _select_pymupdf_pages(pdf_path: Union[str, bytes], pages: Optional[str] = None,
+                              sample: Optional[int] = None) -> Optional[List[int]]:
+        """
+        Resolve a page selection against the page count of a PDF.
+
+        Returns:
+            Optional[List[int]]: Selected 0-based page indices, or None when
+            every page is wanted
+        """
+        if not pages and not sample:
+            return None
+
+        with _open_pymupdf(pdf_path) as doc:
+            return select_pages(len(doc), pages, sample)
+
+    def _extract_pymupdf_range(self, pdf_path: Union[str, bytes], page_numbers: Optional[Sequence[int]] = None,
+                               previous: Optional[Dict[str, Dict[str, Any]]] = None,
+                               repeats: Optional["RepeatedContent"] = None
+                               ) -> Tuple[List[Dict[str, Any]], List[List[str]], List[Optional[str]]]:
+        """
+        Extract the given pages of a PDF with PyMuPDF.
+
+        Args:
+            pdf_path (Union[str, bytes]): Path to the PDF file or its contents
+            page_numbers (Optional[Sequence[int]]): 0-based page indices in
+                ascending order; defaults to every page
+            previous (Optional[Dict]): Manifest entries of the previous run by
+                fingerprint; None disables fingerprinting
+            repeats (Optional[RepeatedContent]): Repeated content to strip;
+                scanned from the pages when None and strip_repeated is set
+
+        Returns:
+            Tuple[List[Dict], List[List[str]], List[Optional[str]]]: Page data,
+            the content digests of every page's images in the same order, and
+            the page fingerprints
+        """
+        page_data = []
+        page_digests = []
+        fingerprints = []
+
+        for page_info, digests, fingerprint in self._iter_pymupdf_pages(pdf_path, page_numbers, previous,
+                                                                          repeats):
+            page_data.append(page_info)
+            page_digests.append(digests)
+            fingerprints.append(fingerprint)
+
+        return page_data, page_digests, fingerprints
+
+    def _iter_pymupdf_pages(self, pdf_path: Union[str, bytes], page_numbers: Optional[Sequence[int]] = None,
+                            previous: Optional[Dict[str, Dict[str, Any]]] = None,
+                            repeats: Optional["RepeatedContent"] = None
+                            ) -> Iterator[Tuple[Dict[str, Any], List[str], Optional[str]]]:
+        """
+        Lazily extract the given pages of a PDF with PyMuPDF. Pages outside
+        the selection are never loaded.
 
-                text = page.get_text()
+        Args:
+            pdf_path (Union[str, bytes]): Path to the PDF file or its contents
+            page_numbers (Optional[Sequence[int]]): 0-based page indices in
+                ascending order; defaults to every page
+            previous (Optional[Dict]): Manifest entries of the previous run by
+                fingerprint; pages found there are reused instead of extracted.
+                None disables fingerprinting
+            repeats (Optional[RepeatedContent]): Repeated content to strip;
+                scanned from the pages when None and strip_repeated is set
+
+        Yields:
+            Tuple[Dict, List[str], Optional[str]]: Page data, the content
+            digests of its images and the page fingerprint
+        """
+        doc = _open_pymupdf(pdf_path)
+        if repeats is None and self.strip_repeated:
+            repeats = RepeatedContent.scan(doc, page_numbers)
+
+        # Images shared between pages are written once and referenced by path
+        xref_cache: Dict[int, Tuple[str, str]] = {}
+        hash_cache: Dict[str, str] = {}
+        xref_digests: Dict[int, str] = {}
+        resource_digests: Dict[int, Optional[str]] = {}
+
+        # Files from the previous run may still be referenced, so they are
+        # reused by content and never overwritten
+        previous_stems = set()
+        for entry in (previous or {}).values():
+            for image_path, digest in zip(entry["page"]["images"], entry["digests"]):
+                previous_stems.add(Path(image_path).stem)
+                if os.path.exists(image_path):
+                    hash_cache.setdefault(digest, image_path)
+
+        if page_numbers is None:
+            page_numbers = range(len(doc))
+
+        writer = None
+        if self.image_writers > 0 and self.output == "disk":
+            writer = _ImageWriter(self.image_writers, self.write_queue_depth)
+        try:
+            for page_num in page_numbers:
+                page = doc.load_page(page_num)
 
                 
                 image_list = page.get_images(full=True)
+                if repeats:
+                    image_list = [img for img in image_list if img[0] not in repeats.xrefs]
+
+                fingerprint = None
+                if previous is not None:
+                    fingerprint = self._page_fingerprint(doc, page, image_list, xref_digests, resource_digests,
+                                                         repeats.key if repeats else "")
+                    entry = previous.get(fingerprint)
+                    if entry and all(os.path.exists(image_path) for image_path in entry["page"]["images"]):
+                        page_info = dict(entry["page"], page_number=page_num + 1)
+                        yield page_info, list(entry["digests"]), fingerprint
+                        continue
+
+                # Plain text and line layout are both read from the same
+                # TextPage, and all image positions from one more pass
+                textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+                text = page.get_text("text", textpage=textpage).strip()
+                text_lines = self._line_positions(page, textpage, text)
+                if repeats:
+                    text, text_lines = repeats.strip_text(text, text_lines)
+
+                boxes = self._image_bboxes(page, image_list)
                 page_images = []
+                image_bboxes = []
+                digests = []
+                # Images first encoded on this page when nothing is written to disk
+                new_images: Dict[str, bytes] = {}
 
                 for img_index, img in enumerate(image_list):
                     try:
                         
                         xref = img[0]
-                        pix = fitz.Pixmap(doc, xref)
-
-                        if pix.n - pix.alpha > 3:
-                            pix = fitz.Pixmap(fitz.csRGB, pix)
-
-                        
-                        image_name = f"page_{page_num + 1}_image_{img_index + 1}.png"
-                        image_path = self.images_dir / image_name
-                        pix.save(str(image_path))
-
-                        page_images.append(str(image_path))
-                        self.logger.info(f"Saved image: {image_name}")
-
-                        pix = None  
+                        if xref in xref_cache:
+                            image_path, digest = xref_cache[xref]
+                        else:
+                            if xref not in xref_digests:
+                                xref_digests[xref] = self._image_digest(doc, img)
+                            digest = xref_digests[xref]
+
+                            if digest in hash_cache:
+                                image_path = hash_cache[digest]
+                            elif self.image_store:
+                                image_path = self._store_image(doc, img, digest, writer)
+                                hash_cache[digest] = image_path
+                            else:
+                                image_stem = f"page_{page_num + 1}_image_{img_index + 1}"
+                                if image_stem in previous_stems:
+                                    image_stem = f"{image_stem}_{digest[:8]}"
+                                if self.output == "memory":
+                                    image_path, data = self._encode_image(doc, img, image_stem)
+                                    new_images[image_path] = data
+                                else:
+                                    image_path = self._save_image(doc, img, image_stem, writer)
+                                hash_cache[digest] = image_path
+
+                            xref_cache[xref] = (image_path, digest)
+
+                        page_images.append(image_path)
+                        image_bboxes.append(boxes[img_index])
+                        digests.append(digest)
 
                     except Exception as e:
                         self.logger.warning(f"Failed to extract image {img_index} from page {page_num + 1}: {e}")
@@ -125,250 +480,2615 @@ class PDFContentExtractor:
                 
                 page_info = {
                     "page_number": page_num + 1,
-                    "text": text.strip(),
+                    "text": text,
                     "images": page_images,
-                    "image_count": len(page_images)
+                    "image_count": len(page_images),
+                    "page_size": [round(page.rect.width, 1), round(page.rect.height, 1)],
+                    "image_bboxes": image_bboxes,
+                    "text_lines": text_lines
                 }
-                page_data.append(page_info)
-
+                if self.output == "memory":
+                    # Moved to self.image_data by the caller; pages extracted in
+                    # worker processes carry their images back this way
+                    page_info["image_data"] = new_images
+                yield page_info, digests, fingerprint
+
+            # Every image must be on disk before the caller saves raw_pages.json
+            if writer:
+                writer.flush()
+        finally:
+            if writer:
+                writer.close()
             doc.close()
-            self.logger.info(f"Successfully extracted content from {len(page_data)} pages")
-            return page_data
 
-        except Exception as e:
-            self.logger.error(f"Error extracting with PyMuPDF: {e}")
-            raise
+    def _extract_pymupdf_parallel(self, pdf_path: Union[str, bytes], workers: int,
+                                  page_numbers: Optional[Sequence[int]] = None,
+                                  previous: Optional[Dict[str, Dict[str, Any]]] = None
+                                  ) -> Tuple[List[Dict[str, Any]], List[List[str]], List[Optional[str]]]:
+        """
+        Extract a PDF with a pool of processes, each opening the file itself
+        and handling one contiguous page range.
+
+        Worker results are stitched back together in page order. Images that
+        more than one worker wrote are collapsed onto the copy from the
+        earliest page, so the output matches the serial path exactly.
+
+        Args:
+            pdf_path (Union[str, bytes]): Path to the PDF file or its contents
+            workers (int): Number of worker processes
+            page_numbers (Optional[Sequence[int]]): 0-based page indices in
+                ascending order; defaults to every page
+            previous (Optional[Dict]): Manifest entries of the previous run by fingerprint
 
-    def extract_with_pdfplumber(self, pdf_path: str) -> List[Dict[str, Any]]:
+        Returns:
+            Tuple[List[Dict], List[List[str]], List[Optional[str]]]: Page data,
+            image digests and page fingerprints, as for _extract_pymupdf_range
         """
-        Extract content using pdfplumber - excellent for text and table extraction.
+        if page_numbers is None:
+            with _open_pymupdf(pdf_path) as doc:
+                page_numbers = range(len(doc))
+
+        page_numbers = list(page_numbers)
+        workers = max(1, min(workers, len(page_numbers)))
+
+        # Every range must strip the same content, so the scan covers the whole selection
+        repeats = None
+        if self.strip_repeated:
+            with _open_pymupdf(pdf_path) as doc:
+                repeats = RepeatedContent.scan(doc, page_numbers)
+
+        bounds = [len(page_numbers) * i // workers for i in range(workers + 1)]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(self._extract_pymupdf_range, pdf_path,
+                            page_numbers[bounds[i]:bounds[i + 1]], previous, repeats)
+                for i in range(workers)
+            ]
+            results = [future.result() for future in futures]
+
+        page_data = []
+        all_digests = []
+        fingerprints = []
+        first_paths: Dict[str, str] = {}
+        stale_paths = set()
+
+        for pages, page_digests, page_fingerprints in results:
+            for page, digests in zip(pages, page_digests):
+                for i, (image_path, digest) in enumerate(zip(page["images"], digests)):
+                    first = first_paths.setdefault(digest, image_path)
+                    if first != image_path:
+                        page["images"][i] = first
+                        stale_paths.add(image_path)
+                        page.get("image_data", {}).pop(image_path, None)
+                page_data.append(page)
+            all_digests.extend(page_digests)
+            fingerprints.extend(page_fingerprints)
+
+        for image_path in stale_paths if self.output == "disk" else ():
+            try:
+                os.remove(image_path)
+            except OSError as e:
+                self.logger.warning(f"Failed to remove duplicate image {image_path}: {e}")
+
+        return page_data, all_digests, fingerprints
+
+    @staticmethod
+    def _line_positions(page, textpage, text: str) -> List[List[float]]:
+        """
+        Locate the text lines of a page in its extracted text.
 
         Args:
-            pdf_path (str): Path to the PDF file
+            page (fitz.Page): Page the text was extracted from
+            textpage (fitz.TextPage): TextPage the text was extracted from
+            text (str): The page text as stored in the page data
 
         Returns:
-            List[Dict]: Extracted content organized by pages
+            List[List[float]]: [offset into text, top, bottom] of every line, in
+            text order
         """
-        if not PDFPLUMBER_AVAILABLE:
-            raise ImportError("pdfplumber is not available. Install with: pip install pdfplumber")
+        positions = []
+        cursor = 0
+
+        for block in page.get_text("dict", textpage=textpage)["blocks"]:
+            for line in block.get("lines", []):
+                line_text = "".join(span["text"] for span in line["spans"]).strip()
+                if not line_text:
+                    continue
+                offset = text.find(line_text, cursor)
+                # Only whole lines count, so a short line cannot match part of
+                # a later one
+                while offset >= 0:
+                    line_start = text.rfind("\n", 0, offset) + 1
+                    line_end = text.find("\n", offset)
+                    if line_end < 0:
+                        line_end = len(text)
+                    if not text[line_start:offset].strip() and not text[offset + len(line_text):line_end].strip():
+                        break
+                    offset = text.find(line_text, offset + 1)
+                if offset < 0:
+                    continue
+                positions.append([offset, round(line["bbox"][1], 1), round(line["bbox"][3], 1)])
+                cursor = offset + len(line_text)
+
+        return positions
+
+    @staticmethod
+    def _image_bboxes(page, image_list: List[tuple]) -> List[Optional[List[float]]]:
+        """
+        Get where the images of a page are drawn.
+
+        A single get_image_info() pass interprets the page once for all
+        images; its entries are matched to image_list by width, height and
+        bits per component. Only an image that matches no entry or several
+        (e.g. one drawn twice, or two of the same size) falls back to
+        page.get_image_bbox, which interprets the whole page on every call.
+
+        Args:
+            page (fitz.Page): Page that displays the images
+            image_list (List[tuple]): Entries from page.get_images(full=True)
+
+        Returns:
+            List[Optional[List[float]]]: Rounded [x0, y0, x1, y1] of every
+            image in image_list, or None where an image is not displayed
+        """
+        shown: Dict[Tuple[int, int, int], List[tuple]] = {}
+        for info in page.get_image_info():
+            shown.setdefault((info["width"], info["height"], info["bpc"]), []).append(info["bbox"])
+        listed = Counter((img[2], img[3], img[4]) for img in image_list)
+
+        boxes = []
+        for img in image_list:
+            key = (img[2], img[3], img[4])
+            if listed[key] == 1 and len(shown.get(key, ())) == 1:
+                rect = fitz.Rect(shown[key][0])
+            else:
+                rect = page.get_image_bbox(img)
+            boxes.append(None if rect.is_empty or rect.is_infinite else _round_box(tuple(rect)))
+
+        return boxes
+
+    def _page_fingerprint(self, doc, page, image_list: List[tuple], xref_digests: Dict[int, str],
+                          resource_digests: Dict[int, Optional[str]], salt: str = "") -> str:
+        """
+        Fingerprint a page by its content stream and the resources it uses.
+
+        Every object reachable from the page resources (Form XObjects and
+        the resources they use in turn, ExtGStates, patterns, shadings,
+        fonts, ...) is hashed by content, so text drawn inside a Form
+        XObject changes the fingerprint too.
+
+        Args:
+            doc (fitz.Document): Open PyMuPDF document
+            page (fitz.Page): Page to fingerprint
+            image_list (List[tuple]): Result of page.get_images(full=True)
+            xref_digests (Dict[int, str]): Image digest cache by xref, updated in place
+            resource_digests (Dict[int, Optional[str]]): Resource digest cache
+                by xref, updated in place
+            salt (str): Extra settings the page output depends on
+
+        Returns:
+            str: Hex digest that changes whenever the page's rendered content can
+        """
+        h = hashlib.sha256(page.read_contents())
+        h.update(repr((tuple(page.rect), page.rotation)).encode())
+        h.update(salt.encode())
+        h.update(self._resource_digest(doc, self._page_resources(doc, page), resource_digests).encode())
+
+        for font in page.get_fonts(full=True):
+            h.update(repr(font[1:]).encode())
+
+        for img in image_list:
+            xref = img[0]
+            if xref not in xref_digests:
+                xref_digests[xref] = self._image_digest(doc, img)
+            h.update(xref_digests[xref].encode())
+            h.update(img[7].encode())
+
+        return h.hexdigest()
+
+    @staticmethod
+    def _page_resources(doc, page) -> str:
+        """Get the source of a page's resource dictionary, which may be inherited."""
+        xref = page.xref
+        while xref:
+            kind, value = doc.xref_get_key(xref, "Resources")
+            if kind != "null":
+                return value
+            kind, value = doc.xref_get_key(xref, "Parent")
+            xref = int(value.split()[0]) if kind == "xref" else 0
+        return ""
+
+    @staticmethod
+    def _resource_digest(doc, source: str, digests: Dict[int, Optional[str]]) -> str:
+        """
+        Replace every object reference in PDF object source by a digest of
+        the referenced object, recursively.
+
+        An object is hashed by its definition and its raw stream. Object
+        numbers do not enter the digest, so resources that were only
+        renumbered in a revised PDF still match.
+
+        Args:
+            doc (fitz.Document): Open PyMuPDF document
+            source (str): PDF object source, e.g. a resource dictionary
+            digests (Dict[int, Optional[str]]): Digest cache by xref, updated in place
+
+        Returns:
+            str: The source with references replaced by digests
+        """
+        def replace(match) -> str:
+            xref = int(match.group(1))
+            if xref not in digests:
+                # Marks the object as in progress, so reference cycles end here
+                digests[xref] = None
+                h = hashlib.sha256(_OBJECT_REF_RE.sub(replace, doc.xref_object(xref, compressed=True)).encode())
+                if doc.xref_is_stream(xref):
+                    h.update(doc.xref_stream_raw(xref) or b"")
+                digests[xref] = h.hexdigest()
+            return digests[xref] or "cycle"
+
+        return _OBJECT_REF_RE.sub(replace, source)
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Load the page manifest written by the previous incremental run.
 
-        self.logger.info(f"Extracting content from {pdf_path} using pdfplumber")
+        Entries whose image files were changed or removed since, for example
+        by a plain run of another PDF into the same directory, are left out.
+
+        Returns:
+            Dict[str, Dict]: Manifest entries by page fingerprint; empty if there
+            is no usable manifest
+        """
+        manifest_path = self.output_dir / self.MANIFEST_FILENAME
 
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                page_data = []
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable manifest {manifest_path}: {e}")
+            return {}
+
+        if (manifest.get("extractor_version") != EXTRACTOR_VERSION
+                or manifest.get("image_mode") != self.image_mode):
+            return {}
+
+        checked: Dict[str, Optional[str]] = {}
+
+        def unchanged(image_path: str, digest: str) -> bool:
+            if image_path not in checked:
+                checked[image_path] = _file_digest(image_path)
+            return checked[image_path] == digest
+
+        entries = {}
+        for entry in manifest.get("pages", []):
+            files = entry.get("files") or []
+            if len(files) == len(entry["page"]["images"]) and all(map(unchanged, entry["page"]["images"], files)):
+                entries[entry["fingerprint"]] = entry
+
+        dropped = len(manifest.get("pages", [])) - len(entries)
+        if dropped:
+            self.logger.info(f"Ignoring {dropped} manifest pages whose images changed since the previous run")
+
+        return entries
+
+    def _save_manifest(self, page_data: List[Dict[str, Any]], page_digests: List[List[str]],
+                       fingerprints: List[Optional[str]], previous: Dict[str, Dict[str, Any]],
+                       partial: bool = False):
+        """
+        Write the page manifest and remove images only the previous run used.
 
-                for page_num, page in enumerate(pdf.pages):
-                    
-                    text = page.extract_text() or ""
+        Args:
+            page_data (List[Dict]): Extracted page data
+            page_digests (List[List[str]]): Image digests of every page
+            fingerprints (List[Optional[str]]): Page fingerprints
+            previous (Dict[str, Dict]): Manifest entries of the previous run
+            partial (bool): Only a page selection was extracted; entries of the
+                other pages are kept and no images are removed
+        """
+        reused = sum(1 for fingerprint in fingerprints if fingerprint in previous)
+        self.logger.info(f"Reused {reused} of {len(page_data)} pages unchanged since the previous run")
+
+        # Files of reused pages were verified when the manifest was loaded
+        file_digests = {image_path: digest for entry in previous.values()
+                        for image_path, digest in zip(entry["page"]["images"], entry.get("files", []))}
+
+        def file_digest(image_path: str) -> Optional[str]:
+            if image_path not in file_digests:
+                file_digests[image_path] = _file_digest(image_path)
+            return file_digests[image_path]
+
+        entries = [
+            {"fingerprint": fingerprint, "digests": digests,
+             "files": [file_digest(image_path) for image_path in page["images"]], "page": page}
+            for page, digests, fingerprint in zip(page_data, page_digests, fingerprints)
+        ]
+
+        if partial:
+            entries += [entry for fingerprint, entry in previous.items() if fingerprint not in fingerprints]
+        else:
+            current_paths = {image_path for page in page_data for image_path in page["images"]}
+            for entry in previous.values():
+                for image_path in entry["page"]["images"]:
+                    # Images in the shared store may be used by other documents
+                    if (image_path not in current_paths and os.path.dirname(image_path) == str(self.images_dir)
+                            and os.path.exists(image_path)):
+                        os.remove(image_path)
+                        current_paths.add(image_path)
+
+        manifest = {
+            "extractor_version": EXTRACTOR_VERSION,
+            "image_mode": self.image_mode,
+            "pages": entries
+        }
+
+        with open(self.output_dir / self.MANIFEST_FILENAME, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+    def _save_image(self, doc, img, image_stem: str, writer: Optional["_ImageWriter"] = None,
+                    directory: Optional[Path] = None) -> str:
+        """
+        Encode one embedded image and write it to the images directory.
 
-                    images = page.images
-                    page_images = []
+        Args:
+            doc (fitz.Document): Open PyMuPDF document
+            img (tuple): Entry from page.get_images(full=True)
+            image_stem (str): File name without extension
+            writer (Optional[_ImageWriter]): Background writer; when omitted the
+                file is written before returning
+            directory (Optional[Path]): Directory to write to instead of the
+                images directory
 
-                    for img_index, img in enumerate(images):
-                        
-                        image_info = {
-                            "x0": img.get("x0", 0),
-                            "y0": img.get("y0", 0),
-                            "x1": img.get("x1", 0),
-                            "y1": img.get("y1", 0),
-                            "width": img.get("width", 0),
-                            "height": img.get("height", 0)
-                        }
-                        page_images.append(image_info)
-
-                    page_info = {
-                        "page_number": page_num + 1,
-                        "text": text.strip(),
-                        "images": [],  
-                        "image_metadata": page_images,
-                        "image_count": len(page_images)
-                    }
-                    page_data.append(page_info)
+        Returns:
+            str: Path of the saved image
+        """
+        image_name, data = self._encode_image(doc, img, image_stem)
 
-                self.logger.info(f"Successfully extracted content from {len(page_data)} pages")
-                return page_data
+        image_path = (directory or self.images_dir) / image_name
+        if writer:
+            writer.submit(image_path, data)
+        else:
+            _ImageWriter.write(image_path, data)
 
-        except Exception as e:
-            self.logger.error(f"Error extracting with pdfplumber: {e}")
-            raise
+        self.logger.info(f"Saved image: {image_name}")
+        return str(image_path)
 
-    def parse_math_questions(self, page_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _encode_image(self, doc, img, image_stem: str) -> Tuple[str, bytes]:
         """
-        Parse the extracted content to identify math questions and their associated images.
-        This is specifically designed for IMO-style math papers.
+        Encode one embedded image for saving.
+
+        In "raw" image mode the original encoded stream (JPEG, JPX, ...) is
+        kept as-is with its native extension. Images with a soft mask or a
+        CMYK colour space cannot be stored faithfully that way and fall back to
+        the Pixmap/PNG path, which is also the default "png" mode.
 
         Args:
-            page_data (List[Dict]): Raw extracted page data
+            doc (fitz.Document): Open PyMuPDF document
+            img (tuple): Entry from page.get_images(full=True)
+            image_stem (str): File name without extension
 
         Returns:
-            List[Dict]: Structured question data matching the assignment's JSON format
+            Tuple[str, bytes]: File name with extension and the encoded image
         """
-        questions = []
+        xref, smask, colorspace = img[0], img[1], img[5]
+        data = None
+
+        if self.image_mode == "raw" and not smask and colorspace != "DeviceCMYK":
+            extracted = doc.extract_image(xref)
+            if extracted and extracted.get("colorspace") != 4:
+                image_name = f"{image_stem}.{extracted['ext']}"
+                data = extracted["image"]
 
-        for page in page_data:
-            text = page["text"]
-            page_images = page["images"]
+        if data is None:
+            pix = fitz.Pixmap(doc, xref)
+
+            if pix.n - pix.alpha > 3:
+                pix = fitz.Pixmap(fitz.csRGB, pix)
 
             
-            lines = text.split('\n')
-            current_question = ""
-            question_images = []
-            option_images = []
+            image_name = f"{image_stem}.png"
+            data = pix.tobytes("png")
 
-            for line in lines:
-                line = line.strip()
+            pix = None  
 
-                
-                if not line:
-                    continue
+        return image_name, data
 
-                
-                if any(keyword in line.lower() for keyword in ["question", "what", "which", "find", "solve", "calculate"]):
-                    
-                    if current_question:
-                        questions.append({
-                            "question": current_question.strip(),
-                            "images": question_images[0] if question_images else "",
-                            "option_images": option_images
-                        })
+    def _store_image(self, doc, img, digest: str, writer: Optional["_ImageWriter"] = None) -> str:
+        """
+        Get the path of an image in the content-addressed store, encoding and
+        writing it only if the store does not have it yet.
 
-                    
-                    current_question = line
-                    question_images = page_images[:1] if page_images else []  
-                    option_images = page_images[1:] if len(page_images) > 1 else []  
+        Files are named <digest>.png, or <digest>-raw.<ext> in "raw" image
+        mode, under <store>/<digest[:2]>/<digest[2:4]>/.
 
-                else:
-                    
-                    if current_question:
-                        current_question += " " + line
+        Args:
+            doc (fitz.Document): Open PyMuPDF document
+            img (tuple): Entry from page.get_images(full=True)
+            digest (str): Content digest from _image_digest
+            writer (Optional[_ImageWriter]): Background writer for new images
+
+        Returns:
+            str: Path of the image in the store
+        """
+        directory = self.image_store / digest[:2] / digest[2:4]
 
-            if current_question:
-                questions.append({
-                    "question": current_question.strip(),
-                    "images": question_images[0] if question_images else "",
-                    "option_images": option_images
-                })
+        if self.image_mode == "raw":
+            image_stem = f"{digest}-raw"
+            # Temporary files of interrupted or concurrent writes are not images
+            existing = next((path for path in directory.glob(f"{image_stem}.*") if path.suffix != ".tmp"),
+                            None) if directory.is_dir() else None
+        else:
+            image_stem = digest
+            existing = directory / f"{digest}.png"
+            if not existing.exists():
+                existing = None
 
-        self.logger.info(f"Parsed {len(questions)} questions from the PDF")
-        return questions
+        if existing:
+            self.logger.info(f"Reused stored image: {existing.name}")
+            return str(existing)
+
+        directory.mkdir(parents=True, exist_ok=True)
+        return self._save_image(doc, img, image_stem, writer, directory)
 
-    def save_json_output(self, data: List[Dict[str, Any]], filename: str = "extracted_content.json"):
+    @staticmethod
+    def _image_digest(doc, img) -> str:
         """
-        Save the extracted and parsed data to a JSON file.
+        Compute a content hash for an embedded image without decoding it.
+
+        The raw (still compressed) stream is hashed together with the image
+        geometry and its soft mask, so two xrefs holding the same picture map
+        to the same digest.
 
         Args:
-            data (List[Dict]): Data to save
-            filename (str): Output JSON filename
+            doc (fitz.Document): Open PyMuPDF document
+            img (tuple): Entry from page.get_images(full=True)
+
+        Returns:
+            str: Hex digest identifying the image content
         """
-        output_path = self.output_dir / filename
+        xref, smask = img[0], img[1]
+        h = hashlib.sha256(doc.xref_stream_raw(xref) or b"")
+        h.update(repr(img[2:6]).encode())
+        if smask:
+            h.update(doc.xref_stream_raw(smask) or b"")
+        return h.hexdigest()
+
+    def extract_with_pdfplumber(self, pdf_path: PDFSource, pages: Optional[str] = None,
+                                sample: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Extract content using pdfplumber - excellent for text and table extraction.
+
+        Args:
+            pdf_path (PDFSource): Path to the PDF file, or its contents as bytes,
+                memoryview or a binary file object
+            pages (Optional[str]): Page selection such as "1-5,20,40-" (1-based)
+            sample (Optional[int]): Only extract this many evenly spaced pages
+                of the selection
+
+        Returns:
+            List[Dict]: Extracted content organized by pages
+        """
+        if not PDFPLUMBER_AVAILABLE:
+            raise ImportError("pdfplumber is not available. Install with: pip install pdfplumber")
+
+        pdf_path = _read_pdf_source(pdf_path)
+        self.logger.info(f"Extracting content from {_source_name(pdf_path)} using pdfplumber")
 
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            page_data = list(self._iter_pdfplumber_pages(pdf_path, pages, sample))
 
-            self.logger.info(f"Saved JSON output to: {output_path}")
-            print(f"JSON output saved to: {output_path}")
+            self.logger.info(f"Successfully extracted content from {len(page_data)} pages")
+            return page_data
 
         except Exception as e:
-            self.logger.error(f"Error saving JSON output: {e}")
+            self.logger.error(f"Error extracting with pdfplumber: {e}")
             raise
 
-    def process_pdf(self, pdf_path: str, method: str = "pymupdf") -> List[Dict[str, Any]]:
+    def _iter_pdfplumber_pages(self, pdf_path: Union[str, bytes], pages: Optional[str] = None,
+                               sample: Optional[int] = None) -> Iterator[Dict[str, Any]]:
         """
-        Main method to process a PDF file and extract all content.
+        Lazily extract the pages of a PDF with pdfplumber. Pages outside the
+        selection are never parsed.
 
         Args:
-            pdf_path (str): Path to the PDF file
-            method (str): Extraction method ("pymupdf" or "pdfplumber")
+            pdf_path (Union[str, bytes]): Path to the PDF file or its contents
+            pages (Optional[str]): Page selection such as "1-5,20,40-" (1-based)
+            sample (Optional[int]): Only extract this many evenly spaced pages
 
-        Returns:
-            List[Dict]: Processed question data
+        Yields:
+            Dict: Extracted content of one page
         """
-        if not os.path.exists(pdf_path):
-            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+        with pdfplumber.open(pdf_path if isinstance(pdf_path, str) else io.BytesIO(pdf_path)) as pdf:
+            page_numbers = select_pages(len(pdf.pages), pages, sample)
 
-        self.logger.info(f"Starting PDF processing: {pdf_path}")
+            for page_num in page_numbers:
+                page = pdf.pages[page_num]
+                
+                text = page.extract_text() or ""
 
-        
+                images = page.images
+                page_images = []
+
+                for img_index, img in enumerate(images):
+                    
+                    image_info = {
+                        "x0": img.get("x0", 0),
+                        "y0": img.get("y0", 0),
+                        "x1": img.get("x1", 0),
+                        "y1": img.get("y1", 0),
+                        "width": img.get("width", 0),
+                        "height": img.get("height", 0)
+                    }
+                    page_images.append(image_info)
+
+                page_info = {
+                    "page_number": page_num + 1,
+                    "text": text.strip(),
+                    "images": [],  
+                    "image_metadata": page_images,
+                    "image_count": len(page_images)
+                }
+
+                # Drop pdfplumber's parsed objects so only one page is held at a time
+                page.flush_cache()
+                yield page_info
+
+    def iter_pages(self, pdf_path: PDFSource, method: str = "pymupdf", pages: Optional[str] = None,
+                   sample: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield extracted pages one at a time instead of building the full list.
+
+        Args:
+            pdf_path (PDFSource): Path to the PDF file, or its contents as bytes,
+                memoryview or a binary file object
+            method (str): Extraction method ("pymupdf" or "pdfplumber")
+            pages (Optional[str]): Page selection such as "1-5,20,40-" (1-based)
+            sample (Optional[int]): Only extract this many evenly spaced pages
+
+        Yields:
+            Dict: Extracted content of one page, in page order. With
+            output="memory", the page's images are in image_data by then
+        """
+        pdf_path = _read_pdf_source(pdf_path)
         if method.lower() == "pymupdf":
-            page_data = self.extract_with_pymupdf(pdf_path)
+            if not PYMUPDF_AVAILABLE:
+                raise ImportError("PyMuPDF is not available. Install with: pip install PyMuPDF")
+            page_numbers = self._select_pymupdf_pages(pdf_path, pages, sample)
+            page_iter = (page_info for page_info, _, _ in self._iter_pymupdf_pages(pdf_path, page_numbers))
         elif method.lower() == "pdfplumber":
-            page_data = self.extract_with_pdfplumber(pdf_path)
+            if not PDFPLUMBER_AVAILABLE:
+                raise ImportError("pdfplumber is not available. Install with: pip install pdfplumber")
+            page_iter = self._iter_pdfplumber_pages(pdf_path, pages, sample)
         else:
             raise ValueError(f"Unknown extraction method: {method}")
 
-        
-        questions = self.parse_math_questions(page_data)
+        self.logger.info(f"Streaming content from {_source_name(pdf_path)} using {method}")
 
-        
-        self.save_json_output(questions, "questions.json")
-        self.save_json_output(page_data, "raw_pages.json")
+        page_count = 0
+        self.text_bytes_saved = 0
+        self.image_data = {}
+        for page_info in page_iter:
+            page_count += 1
+            self.image_data.update(page_info.pop("image_data", {}))
+            if self.compact_text:
+                self.text_bytes_saved += self._compact_page(page_info)
+            yield page_info
 
-        return questions
+        self.logger.info(f"Successfully extracted content from {page_count} pages")
 
+    @staticmethod
+    def _compact_page(page_info: Dict[str, Any]) -> int:
+        """
+        Compact the text of a page in place.
 
-def main():
-    """Main function with command-line interface."""
-    parser = argparse.ArgumentParser(
-        description="PDF Content Extraction Tool for Math Olympiad Papers",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Examples:
-  python pdf_extractor.py sample.pdf
-  python pdf_extractor.py sample.pdf --method pdfplumber --output results
-  python pdf_extractor.py sample.pdf --method pymupdf --output /path/to/output
+        Args:
+            page_info (Dict): Page data; "text" and "text_lines" are replaced
+
+        Returns:
+            int: Number of UTF-8 bytes removed from the text
         """
-    )
+        text = page_info["text"]
+        page_info["text"], text_lines = compact_text(text, page_info.get("text_lines"))
+        if text_lines is not None:
+            page_info["text_lines"] = text_lines
+        return len(text.encode("utf-8")) - len(page_info["text"].encode("utf-8"))
 
-    parser.add_argument(
-        "pdf_path",
-        help="Path to the PDF file to process"
-    )
+    def parse_math_questions(self, page_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Parse the extracted content to identify math questions and their associated images.
+        This is specifically designed for IMO-style math papers.
 
-    parser.add_argument(
-        "--method",
-        choices=["pymupdf", "pdfplumber"],
-        default="pymupdf",
-        help="PDF extraction method (default: pymupdf)"
-    )
+        Args:
+            page_data (List[Dict]): Raw extracted page data
 
-    parser.add_argument(
-        "--output",
-        default="extracted_content",
-        help="Output directory for results (default: extracted_content)"
-    )
+        Returns:
+            List[Dict]: Structured question data matching the assignment's JSON format
+        """
+        questions = list(self.iter_math_questions(page_data))
 
-    parser.add_argument(
-        "--verbose",
-        action="store_true",
-        help="Enable verbose logging"
-    )
+        self.logger.info(f"Parsed {len(questions)} questions from the PDF")
+        return questions
 
-    args = parser.parse_args()
+    def iter_math_questions(self, pages: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming counterpart of parse_math_questions that consumes pages lazily.
 
-    # Check library availability
-    if args.method == "pymupdf" and not PYMUPDF_AVAILABLE:
-        print("Error: PyMuPDF is not installed. Install with: pip install PyMuPDF")
-        return 1
+        Questions continue across page breaks, and each one is yielded as soon
+        as the page that closes it has been read.
 
-    if args.method == "pdfplumber" and not PDFPLUMBER_AVAILABLE:
-        print("Error: pdfplumber is not installed. Install with: pip install pdfplumber")
-        return 1
+        Args:
+            pages (Iterable[Dict]): Raw extracted page data, e.g. from iter_pages
 
-    if not PILLOW_AVAILABLE:
-        print("Warning: Pillow is not installed. Image processing may be limited.")
+        Yields:
+            Dict: Structured question data matching the assignment's JSON format
+        """
+        for record in QuestionParser().parse(pages):
+            yield record.to_dict()
+
+    @staticmethod
+    def build_answer_key(questions: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Index the answers of parsed questions by question number.
+
+        Numbering may restart, e.g. per section, so the n-th question with a
+        number that was already used is keyed "<number>#<n>" ("1#2" for the
+        second question 1).
+
+        Args:
+            questions (Iterable[Dict]): Parsed question data, in document order
+
+        Returns:
+            Dict[str, str]: Question key (as a JSON object key) -> answer label
+        """
+        answer_key = {}
+        occurrences = Counter()
+        for question in questions:
+            number = question["number"]
+            occurrences[number] += 1
+            if question.get("answer"):
+                key = str(number) if occurrences[number] == 1 else f"{number}#{occurrences[number]}"
+                answer_key[key] = question["answer"]
+        return answer_key
+
+    def save_json_output(self, data: Union[List[Dict[str, Any]], Dict[str, Any]],
+                         filename: str = "extracted_content.json"):
+        """
+        Save the extracted and parsed data to a JSON file.
+
+        Args:
+            data (Union[List[Dict], Dict]): Data to save
+            filename (str): Output JSON filename; in jsonl mode lists are written
+                as JSON Lines to the matching .jsonl file
+        """
+        if self.output_format == "jsonl" and isinstance(data, list):
+            self.save_json_stream(data, filename)
+            return
+
+        output_path = self.output_dir / filename
+
+        try:
+            with open(output_path, 'wb') as f:
+                f.write(self.serializer.dumps(data))
+
+            self.logger.info(f"Saved JSON output to: {output_path}")
+            print(f"JSON output saved to: {output_path}")
+
+        except Exception as e:
+            self.logger.error(f"Error saving JSON output: {e}")
+            raise
+
+    def _cache_key(self, pdf_path: Union[str, bytes], method: str, pages: Optional[str] = None,
+                   sample: Optional[int] = None) -> str:
+        """
+        Build the result cache key for a PDF.
+
+        Args:
+            pdf_path (Union[str, bytes]): Path to the PDF file or its contents
+            method (str): Extraction method
+            pages (Optional[str]): Page selection
+            sample (Optional[int]): Page sample size
+
+        Returns:
+            str: Hex digest over the PDF contents, the extraction settings and
+            the extractor/parser versions
+        """
+        if isinstance(pdf_path, bytes):
+            pdf_hash = hashlib.sha256(pdf_path)
+        else:
+            pdf_hash = hashlib.sha256()
+            with open(pdf_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    pdf_hash.update(chunk)
+
+        # Cached page data holds image paths, so the output location is part of the key
+        parts = [pdf_hash.hexdigest(), method.lower(), self.image_mode, str(self.images_dir),
+                 f"store-{self.image_store or ''}",
+                 f"strip-{int(self.strip_repeated)}", f"compact-{int(self.compact_text)}",
+                 f"pages-{pages or ''}", f"sample-{sample or ''}",
+                 f"extractor-{EXTRACTOR_VERSION}", f"parser-{PARSER_VERSION}"]
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+    @staticmethod
+    def _image_file_digests(page_data: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """Hash every image file referenced by page data, by path."""
+        return {image_path: _file_digest(image_path) for page in page_data for image_path in page["images"]}
+
+    @staticmethod
+    def _cached_images_match(image_files: Optional[Dict[str, str]]) -> bool:
+        """
+        Check that the images of a cached result are still on disk unchanged.
+
+        Another run into the same output directory may have overwritten them
+        with the images of a different PDF.
+        """
+        return image_files is not None and all(
+            digest is not None and _file_digest(image_path) == digest
+            for image_path, digest in image_files.items()
+        )
+
+    def save_json_stream(self, items: Iterable[Dict[str, Any]], filename: str) -> int:
+        """
+        Save items to a JSON array file as they are produced, without holding
+        the whole list in memory. The file layout matches save_json_output.
+
+        Args:
+            items (Iterable[Dict]): Items to save, typically a generator
+            filename (str): Output JSON filename
+
+        Returns:
+            int: Number of items written
+        """
+        try:
+            with self._open_array_writer(filename) as writer:
+                output_path = writer.path
+                for item in items:
+                    writer.write(item)
+
+            self.logger.info(f"Saved JSON output to: {output_path}")
+            print(f"JSON output saved to: {output_path}")
+            return writer.count
+
+        except Exception as e:
+            self.logger.error(f"Error saving JSON output: {e}")
+            raise
+
+    def _open_array_writer(self, filename: str) -> Union["_JSONArrayWriter", "_JSONLinesWriter"]:
+        """
+        Create the incremental writer for a list output in the configured format.
+
+        Args:
+            filename (str): Output JSON filename; ".json" becomes ".jsonl" in
+                jsonl mode
+
+        Returns:
+            Union[_JSONArrayWriter, _JSONLinesWriter]: Writer to use as a
+            context manager
+        """
+        if self.output_format == "jsonl":
+            return _JSONLinesWriter(self.output_dir / Path(filename).with_suffix(".jsonl"),
+                                    self.serializer, self.flush_every)
+        return _JSONArrayWriter(self.output_dir / filename, self.serializer)
+
+    def process_pdf(self, pdf_path: PDFSource, method: str = "pymupdf", workers: int = 1,
+                    refresh: bool = False, pages: Optional[str] = None,
+                    sample: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Main method to process a PDF file and extract all content.
+
+        Args:
+            pdf_path (PDFSource): Path to the PDF file, or its contents as bytes,
+                memoryview or a binary file object
+            method (str): Extraction method ("pymupdf" or "pdfplumber")
+            workers (int): Worker processes for page-parallel extraction (PyMuPDF only)
+            refresh (bool): Ignore any cached result and re-extract (the new
+                result is still stored in the cache)
+            pages (Optional[str]): Page selection such as "1-5,20,40-" (1-based)
+            sample (Optional[int]): Only extract this many evenly spaced pages
+
+        Returns:
+            List[Dict]: Processed question data. With output="memory" nothing
+            is saved; the page data is left in extracted_data and the encoded
+            images in image_data
+        """
+        pdf_path = _read_pdf_source(pdf_path)
+        if isinstance(pdf_path, str) and not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+
+        self.logger.info(f"Starting PDF processing: {_source_name(pdf_path)}")
+        self.text_bytes_saved = 0
+
+        cached = None
+        if self.cache:
+            cache_key = self._cache_key(pdf_path, method, pages, sample)
+            if not refresh:
+                cached = self.cache.get(cache_key)
+
+        if cached and self._cached_images_match(cached[2]):
+            page_data, questions, _ = cached
+            self.logger.info(f"Loaded cached extraction for {_source_name(pdf_path)}")
+
+        else:
+            
+            if method.lower() == "pymupdf":
+                page_data = self.extract_with_pymupdf(pdf_path, workers=workers, pages=pages, sample=sample)
+            elif method.lower() == "pdfplumber":
+                page_data = self.extract_with_pdfplumber(pdf_path, pages=pages, sample=sample)
+            else:
+                raise ValueError(f"Unknown extraction method: {method}")
+
+            if self.compact_text:
+                self.text_bytes_saved = sum(self._compact_page(page_info) for page_info in page_data)
+                self.logger.info(f"Compacted page text: {self.text_bytes_saved} bytes saved")
+
+            
+            questions = self.parse_math_questions(page_data)
+
+            if self.cache:
+                self.cache.put(cache_key, page_data, questions, self._image_file_digests(page_data))
+
+        self.extracted_data = page_data
+
+        
+        if self.output == "disk":
+            self.save_json_output(questions, "questions.json")
+            self.save_json_output(self.build_answer_key(questions), "answer_key.json")
+            self.save_json_output(page_data, "raw_pages.json")
+
+        return questions
+
+    def process_pdf_streaming(self, pdf_path: PDFSource, method: str = "pymupdf", pages: Optional[str] = None,
+                              sample: Optional[int] = None) -> int:
+        """
+        Process a PDF page by page, writing raw_pages.json and questions.json
+        while extraction is still running; answer_key.json follows at the end.
+        Peak memory is bounded by a single page rather than the whole document.
+        The result cache is neither read nor written.
+
+        Args:
+            pdf_path (PDFSource): Path to the PDF file, or its contents as bytes,
+                memoryview or a binary file object
+            method (str): Extraction method ("pymupdf" or "pdfplumber")
+            pages (Optional[str]): Page selection such as "1-5,20,40-" (1-based)
+            sample (Optional[int]): Only extract this many evenly spaced pages
+
+        Returns:
+            int: Number of questions written
+        """
+        if self.output != "disk":
+            raise ValueError("Streaming processing writes its output to disk; use iter_pages instead")
+        if self.incremental:
+            raise ValueError("Streaming processing keeps no page manifest; use process_pdf for incremental mode")
+
+        pdf_path = _read_pdf_source(pdf_path)
+        if isinstance(pdf_path, str) and not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+
+        self.logger.info(f"Starting streaming PDF processing: {_source_name(pdf_path)}")
+
+        answers: List[Dict[str, Any]] = []
+
+        with self._open_array_writer("raw_pages.json") as raw_writer:
+            raw_path = raw_writer.path
+
+            def recorded_pages():
+                for page_info in self.iter_pages(pdf_path, method, pages=pages, sample=sample):
+                    raw_writer.write(page_info)
+                    yield page_info
+
+            def recorded_questions():
+                for question in self.iter_math_questions(recorded_pages()):
+                    answers.append({"number": question["number"], "answer": question["answer"]})
+                    yield question
+
+            question_count = self.save_json_stream(recorded_questions(), "questions.json")
+
+        self.logger.info(f"Saved JSON output to: {raw_path}")
+        print(f"JSON output saved to: {raw_path}")
+        self.save_json_output(self.build_answer_key(answers), "answer_key.json")
+        if self.compact_text:
+            self.logger.info(f"Compacted page text: {self.text_bytes_saved} bytes saved")
+        self.logger.info(f"Parsed {question_count} questions from the PDF")
+
+        return question_count
+
+
+class QuestionRecord:
+    """
+    A parsed question that references its text instead of copying it.
+
+    The stem and every option are kept as (page_number, start, end) spans
+    into the page texts and are only assembled when the record is serialised.
+    """
+
+    __slots__ = ("number", "spans", "options", "options_at", "answer", "texts", "images", "option_images")
+
+    def __init__(self, number: int, images: List[str], option_images: List[str]):
+        self.number = number
+        self.spans: List[Tuple[int, int, int]] = []
+        self.options: List[Tuple[str, List[Tuple[int, int, int]]]] = []
+        self.options_at: Optional[Tuple[int, int]] = None
+        self.answer = ""
+        self.texts: Dict[int, str] = {}
+        self.images = images
+        self.option_images = option_images
+
+    def extend(self, page_number: int, text: str, start: int, end: int):
+        """Add the line text[start:end] of a page to the question stem."""
+        self._add_span(self.spans, page_number, text, start, end)
+
+    def add_option(self, label: str, page_number: int, text: str, start: int, end: int):
+        """Start option `label` with the text text[start:end]."""
+        if self.options_at is None:
+            self.options_at = (page_number, start)
+        self.options.append((label, []))
+        if start < end:
+            self._add_span(self.options[-1][1], page_number, text, start, end)
+
+    def extend_option(self, page_number: int, text: str, start: int, end: int):
+        """Add a wrapped line to the last option."""
+        self._add_span(self.options[-1][1], page_number, text, start, end)
+
+    def _add_span(self, spans: List[Tuple[int, int, int]], page_number: int, text: str, start: int, end: int):
+        if spans and spans[-1][0] == page_number:
+            spans[-1] = (page_number, spans[-1][1], end)
+        else:
+            spans.append((page_number, start, end))
+            self.texts[page_number] = text
+
+    def _join(self, spans: List[Tuple[int, int, int]]) -> str:
+        parts = []
+        for page_number, start, end in spans:
+            for line in self.texts[page_number][start:end].split('\n'):
+                line = line.strip()
+                if line:
+                    parts.append(line)
+        return " ".join(parts)
+
+    @property
+    def text(self) -> str:
+        """The question stem, one space between its non-blank lines."""
+        return self._join(self.spans)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serialise into the questions.json record format. "images" keeps the
+        first question image for compatibility; "question_images" lists all.
+        """
+        options = [{"label": label, "text": self._join(spans), "image": ""} for label, spans in self.options]
+
+        # Picture options have no text; pair them with the page's option
+        # images when the counts line up
+        if options and not any(option["text"] for option in options) \
+                and len(self.option_images) == len(options):
+            for option, image in zip(options, self.option_images):
+                option["image"] = image
+
+        return {
+            "number": self.number,
+            "question": self.text,
+            "options": options,
+            "answer": self.answer,
+            "images": self.images[0] if self.images else "",
+            "question_images": self.images,
+            "option_images": self.option_images
+        }
+
+
+class QuestionParser:
+    """
+    Incremental question parser that keeps its state between pages.
+
+    Each non-blank line is located by _CONTENT_LINE_RE and classified once by
+    _LINE_TOKEN_RE, both working on offsets into the page text, and fed to a
+    small state machine: a question number ("12.") opens a question (while
+    one is open, only a number higher than its own does, so numbering may
+    restart per section), text extends its stem, option markers ("[A]".."[D]")
+    start options that later text lines continue, and an "Ans" line records
+    the answer and closes it. Text outside any question (headers, section
+    titles, diagram labels) is dropped. A question left open at the end of a
+    page carries on into the next one.
+
+    When the page data carries layout ("text_lines" and "image_bboxes", as
+    produced by PyMuPDF), images are assigned spatially: every question owns
+    the vertical band from its first line down to the next question on the
+    page (a question continued from the previous page starts at the first
+    line), and an image goes to the band containing its centre, found by
+    bisection over the sorted band tops. Within a band, images above the
+    first option marker belong to the question and the rest are option
+    images. Without layout every question gets the first page image as its
+    image and the remaining ones as option images.
+    """
+
+    def __init__(self):
+        self.last_number = 0
+        self._current: Optional[QuestionRecord] = None
+
+    def parse(self, pages: Iterable[Dict[str, Any]]) -> Iterator[QuestionRecord]:
+        """
+        Parse a sequence of pages, which may be a list or a generator.
+
+        Yields:
+            QuestionRecord: Questions in document order, as soon as they are closed
+        """
+        for page in pages:
+            yield from self.feed(page)
+        yield from self.close()
+
+    def feed(self, page: Dict[str, Any]) -> List[QuestionRecord]:
+        """
+        Consume one page.
+
+        Args:
+            page (Dict): Raw extracted page data
+
+        Returns:
+            List[QuestionRecord]: Questions that were closed on this page
+        """
+        questions = []
+        text = page["text"]
+        page_number = page["page_number"]
+        page_images = page["images"]
+        first_line = True
+
+        spatial = page.get("text_lines") is not None and page.get("image_bboxes") is not None
+        on_page = [self._current] if self._current else []
+
+        for line in _CONTENT_LINE_RE.finditer(text):
+            start, end = line.span(1)
+
+            # The running page number heads every page; it must not leak into
+            # a question continued from the previous page
+            if first_line:
+                first_line = False
+                if text[start:end] == str(page_number):
+                    continue
+
+            token = _LINE_TOKEN_RE.match(text, start, end)
+            kind = token.lastgroup if token else None
+
+            # While a question is open only a higher number starts the next
+            # one; otherwise numbering may restart, e.g. in a new section
+            if kind == "number" and (self._current is None or int(token.group("number")) > self.last_number):
+                if self._current:
+                    questions.append(self._current)
+
+                self.last_number = int(token.group("number"))
+                if spatial:
+                    self._current = QuestionRecord(self.last_number, [], [])
+                else:
+                    self._current = QuestionRecord(self.last_number, page_images[:1], page_images[1:])
+                self._current.extend(page_number, text, start, end)
+                on_page.append(self._current)
+
+            elif self._current is None:
+                continue
+
+            elif kind == "answer":
+                answer = _ANSWER_RE.match(text, start, end)
+                if answer:
+                    self._current.answer = answer.group(1)
+                else:
+                    logging.getLogger(__name__).warning(
+                        f"No answer label in {text[start:end]!r} (question {self._current.number}, "
+                        f"page {page_number})")
+                questions.append(self._current)
+                self._current = None
+
+            elif kind == "option":
+                self._add_options(page_number, text, start, end)
+
+            elif self._current.options:
+                self._current.extend_option(page_number, text, start, end)
+
+            else:
+                self._current.extend(page_number, text, start, end)
+
+        if spatial and on_page:
+            self._place_images(page, on_page)
+
+        return questions
+
+    @staticmethod
+    def _place_images(page: Dict[str, Any], records: List[QuestionRecord]):
+        """
+        Assign the images of a page to the questions whose band contains them.
+
+        Args:
+            page (Dict): Page data with "text_lines", "image_bboxes" and "page_size"
+            records (List[QuestionRecord]): Questions present on the page, the
+                one continued from the previous page first
+        """
+        page_number = page["page_number"]
+        lines = page["text_lines"]
+        line_offsets = [line[0] for line in lines]
+
+        def top_of(offset: int) -> float:
+            index = bisect.bisect_right(line_offsets, offset) - 1
+            return lines[max(index, 0)][1] if lines else float("-inf")
+
+        bands = []
+        for record in records:
+            first_page, first_offset = record.spans[0][0], record.spans[0][1]
+            # A continued question starts at the first line, so images in the
+            # header area above it are left unassigned
+            band_top = top_of(first_offset if first_page == page_number else 0)
+
+            if record.options_at is None:
+                options_top = float("inf")
+            elif record.options_at[0] == page_number:
+                options_top = top_of(record.options_at[1])
+            else:
+                options_top = float("-inf")
+
+            bands.append((band_top, options_top, record))
+
+        bands.sort(key=lambda band: band[0])
+        band_tops = [band[0] for band in bands]
+
+        width, height = page.get("page_size") or (0, 0)
+        placed = sorted(
+            (box[1], box[0], box[3], image_path)
+            for image_path, box in zip(page["images"], page["image_bboxes"]) if box
+            # Full-page backgrounds belong to no question
+            and not (width and height and (box[2] - box[0]) * (box[3] - box[1]) >= 0.5 * width * height)
+        )
+
+        for top, _, bottom, image_path in placed:
+            centre = (top + bottom) / 2
+
+            index = bisect.bisect_right(band_tops, centre) - 1
+            if index < 0:
+                continue
+
+            _, options_top, record = bands[index]
+            if centre >= options_top:
+                record.option_images.append(image_path)
+            else:
+                record.images.append(image_path)
+
+    def _add_options(self, page_number: int, text: str, start: int, end: int):
+        """Split a line such as "[A] Rs 70.00 [B] Rs 76.01" into its options."""
+        markers = list(_OPTION_RE.finditer(text, start, end))
+        for marker, following in zip(markers, markers[1:] + [None]):
+            option_start = marker.end()
+            option_end = following.start() if following else end
+            # Trim the blanks around the option text
+            while option_start < option_end and text[option_start].isspace():
+                option_start += 1
+            while option_end > option_start and text[option_end - 1].isspace():
+                option_end -= 1
+            self._current.add_option(marker.group(1), page_number, text, option_start, option_end)
+
+    def close(self) -> List[QuestionRecord]:
+        """
+        Finish parsing and return the question still open, if any.
+
+        Returns:
+            List[QuestionRecord]: The last question, or an empty list
+        """
+        current, self._current = self._current, None
+        return [current] if current else []
+
+
+class RepeatedContent:
+    """
+    Header, footer and watermark content repeated across the pages of a document.
+
+    Only the first and last EDGE_LINES lines of each page are considered. A
+    line is keyed by its position from the top or bottom and its text with
+    digits masked, so running page numbers match. Lines the question parser
+    reads (question numbers, options and answers) are never treated as
+    repeated. Anything found on at least half of the scanned pages is
+    repeated; long documents are scanned on an evenly spaced sample.
+    """
+
+    EDGE_LINES = 3
+    MIN_PAGES = 3
+    SAMPLE_PAGES = 24
+
+    __slots__ = ("lines", "xrefs", "key")
+
+    def __init__(self, lines: Iterable[Tuple[int, str]] = (), xrefs: Iterable[int] = ()):
+        self.lines = frozenset(lines)
+        self.xrefs = frozenset(xrefs)
+        self.key = hashlib.sha256(repr((sorted(self.lines), sorted(self.xrefs))).encode()).hexdigest()
+
+    def __bool__(self) -> bool:
+        return bool(self.lines or self.xrefs)
+
+    @classmethod
+    def scan(cls, doc, page_numbers: Optional[Sequence[int]] = None) -> "RepeatedContent":
+        """
+        Find the lines and images repeated across pages of a document.
+
+        Args:
+            doc (fitz.Document): Open PyMuPDF document
+            page_numbers (Optional[Sequence[int]]): 0-based page indices to
+                scan; defaults to every page
+
+        Returns:
+            RepeatedContent: The repeated content, empty for fewer than
+            MIN_PAGES pages
+        """
+        indices = list(page_numbers) if page_numbers is not None else list(range(len(doc)))
+        if len(indices) > cls.SAMPLE_PAGES:
+            indices = [indices[i] for i in select_pages(len(indices), sample=cls.SAMPLE_PAGES)]
+        if len(indices) < cls.MIN_PAGES:
+            return cls()
+
+        line_counts = Counter()
+        xref_counts = Counter()
+        for page_num in indices:
+            page = doc.load_page(page_num)
+            xref_counts.update({img[0] for img in page.get_images()})
+            lines = page.get_text().strip().split("\n")
+            line_counts.update({key for _, key in cls._edge_keys(lines)})
+
+        needed = max(cls.MIN_PAGES, (len(indices) + 1) // 2)
+        return cls((key for key, count in line_counts.items() if count >= needed),
+                   (xref for xref, count in xref_counts.items() if count >= needed))
+
+    @classmethod
+    def _edge_keys(cls, lines: List[str]) -> Iterator[Tuple[int, Tuple[int, str]]]:
+        """Yield (line index, key) for the top and bottom lines of a page."""
+        edge = min(cls.EDGE_LINES, len(lines))
+        for position in range(edge):
+            for index in (position, len(lines) - 1 - position):
+                line = " ".join(lines[index].split())
+                if line and not _LINE_TOKEN_RE.match(line):
+                    signed = position if index == position else -1 - position
+                    yield index, (signed, _DIGITS_RE.sub("#", line))
+
+    def strip_text(self, text: str, line_positions: List[List[float]]
+                   ) -> Tuple[str, List[List[float]]]:
+        """
+        Remove the repeated lines from the text of a page.
+
+        Args:
+            text (str): Page text
+            line_positions (List[List[float]]): [offset, top, bottom] of the
+                text lines, as built by _line_positions
+
+        Returns:
+            Tuple[str, List[List[float]]]: The text without repeated lines and
+            the positions of the remaining lines with offsets into it
+        """
+        lines = text.split("\n")
+        dropped = {index for index, key in self._edge_keys(lines) if key in self.lines}
+        if not dropped:
+            return text, line_positions
+
+        # Old and new start offset of every line, None where it was dropped
+        old_starts = []
+        new_starts = []
+        old_offset = new_offset = 0
+        for index, line in enumerate(lines):
+            old_starts.append(old_offset)
+            old_offset += len(line) + 1
+            if index in dropped:
+                new_starts.append(None)
+            else:
+                new_starts.append(new_offset)
+                new_offset += len(line) + 1
+
+        joined = "\n".join(line for index, line in enumerate(lines) if index not in dropped)
+        stripped = joined.strip()
+        lead = len(joined) - len(joined.lstrip())
+
+        positions = []
+        for offset, top, bottom in line_positions:
+            index = bisect.bisect_right(old_starts, offset) - 1
+            if new_starts[index] is None:
+                continue
+            new = new_starts[index] + offset - old_starts[index] - lead
+            if 0 <= new < len(stripped):
+                positions.append([new, top, bottom])
+
+        return stripped, positions
+
+
+class ExtractionCache:
+    """
+    Persistent SQLite cache of extraction results with size-based LRU eviction.
+
+    A connection is opened per operation, so the cache can be shared by
+    extractor instances that are pickled into worker processes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        Args:
+            cache_dir (str): Directory holding the cache database
+            max_bytes (int): Total size of stored results before eviction starts
+        """
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.db_path = self.cache_dir / "results.sqlite3"
+        self.max_bytes = max_bytes
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, page_data TEXT, questions TEXT, "
+                "size INTEGER, last_used REAL, image_files TEXT)"
+            )
+            # Caches created before image digests were stored; their rows never match
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+            if "image_files" not in columns:
+                conn.execute("ALTER TABLE results ADD COLUMN image_files TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(self, key: str) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Optional[Dict[str, str]]]]:
+        """
+        Look up a cached result and mark it as recently used.
+
+        Returns:
+            Optional[Tuple[List[Dict], List[Dict], Optional[Dict[str, str]]]]: Page
+            data, questions and the content digests of the image files by path
+            (None for results stored without them), or None on a miss
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT page_data, questions, image_files FROM results WHERE key = ?",
+                               (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+
+        return json.loads(row[0]), json.loads(row[1]), json.loads(row[2]) if row[2] else None
+
+    def put(self, key: str, page_data: List[Dict[str, Any]], questions: List[Dict[str, Any]],
+            image_files: Dict[str, Optional[str]]):
+        """Store a result, then evict least recently used entries above the size limit."""
+        page_json = json.dumps(page_data, ensure_ascii=False)
+        questions_json = json.dumps(questions, ensure_ascii=False)
+        files_json = json.dumps(image_files)
+        size = len(page_json.encode('utf-8')) + len(questions_json.encode('utf-8')) + len(files_json)
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, page_data, questions, size, last_used, image_files) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, page_json, questions_json, size, time.time(), files_json)
+            )
+
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, old_size in conn.execute(
+                        "SELECT key, size FROM results ORDER BY last_used").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                    total -= old_size
+
+
+class _ImageWriter:
+    """Write encoded image buffers to disk on a bounded background thread pool."""
+
+    def __init__(self, max_workers: int, queue_depth: int):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-writer")
+        self._slots = threading.BoundedSemaphore(max(1, queue_depth))
+        self._futures = []
+
+    @staticmethod
+    def write(path: Path, data: bytes):
+        """
+        Write one buffer synchronously. The file appears under its final name
+        only once complete, as other processes may read a shared image store.
+        """
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def submit(self, path: Path, data: bytes):
+        """Queue a buffer for writing, blocking while the queue is full."""
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(self.write, path, data)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def flush(self):
+        """Wait for every queued write and re-raise the first failure."""
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """Stop the pool after the queued writes have finished."""
+        self._pool.shutdown(wait=True)
+
+
+class JSONSerializer:
+    """
+    Encode output data to UTF-8 JSON with orjson, msgspec or the standard
+    library, indented by two spaces or compact.
+
+    All backends produce equivalent JSON, laid out the same way; number
+    formatting may differ (orjson and msgspec write 1e20 and 1e-7 where the
+    standard library writes 1e+20 and 1e-07).
+    """
+
+    BACKENDS = ("auto", "orjson", "msgspec", "json")
+
+    __slots__ = ("backend", "compact")
+
+    def __init__(self, backend: str = "auto", compact: bool = False):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown JSON backend: {backend}")
+        if backend == "auto":
+            backend = "orjson" if ORJSON_AVAILABLE else "msgspec" if MSGSPEC_AVAILABLE else "json"
+        elif backend == "orjson" and not ORJSON_AVAILABLE:
+            raise ImportError("orjson is not available. Install with: pip install orjson")
+        elif backend == "msgspec" and not MSGSPEC_AVAILABLE:
+            raise ImportError("msgspec is not available. Install with: pip install msgspec")
+
+        self.backend = backend
+        self.compact = compact
+
+    def dumps(self, data: Any) -> bytes:
+        """
+        Serialize data to JSON.
+
+        Args:
+            data (Any): JSON-compatible data
+
+        Returns:
+            bytes: UTF-8 encoded JSON
+        """
+        if self.backend == "orjson":
+            return orjson.dumps(data) if self.compact else orjson.dumps(data, option=orjson.OPT_INDENT_2)
+        if self.backend == "msgspec":
+            encoded = msgspec.json.encode(data)
+            return encoded if self.compact else msgspec.json.format(encoded, indent=2)
+        if self.compact:
+            return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+class _JSONLinesWriter:
+    """
+    Write JSON Lines, one element per line, flushing after every flush_every
+    lines and at least every FLUSH_INTERVAL seconds so readers can follow
+    the file.
+    """
+
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, path: Path, serializer: "JSONSerializer", flush_every: int = 1):
+        self.path = path
+        self.count = 0
+        self.flush_every = max(1, flush_every)
+        self._serializer = JSONSerializer(serializer.backend, compact=True)
+        self._file = None
+        self._unflushed = 0
+        self._last_flush = 0.0
+
+    def __enter__(self):
+        self._file = open(self.path, 'wb')
+        self._last_flush = time.monotonic()
+        return self
+
+    def write(self, item: Dict[str, Any]):
+        """Append one element as a line."""
+        self._file.write(self._serializer.dumps(item) + b"\n")
+        self.count += 1
+        self._unflushed += 1
+
+        now = time.monotonic()
+        if self._unflushed >= self.flush_every or now - self._last_flush >= self.FLUSH_INTERVAL:
+            self._file.flush()
+            self._unflushed = 0
+            self._last_flush = now
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        return False
+
+
+class _JSONArrayWriter:
+    """Incrementally write a JSON array, one element at a time."""
+
+    def __init__(self, path: Path, serializer: "JSONSerializer"):
+        self.path = path
+        self.count = 0
+        self._serializer = serializer
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'wb')
+        return self
+
+    def write(self, item: Dict[str, Any]):
+        """Append one element, formatted like the serializer's dumps() of the whole list."""
+        encoded = self._serializer.dumps(item)
+        if self._serializer.compact:
+            self._file.write((b"[" if self.count == 0 else b",") + encoded)
+        else:
+            encoded = encoded.replace(b"\n", b"\n  ")
+            self._file.write((b"[\n  " if self.count == 0 else b",\n  ") + encoded)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.count:
+            self._file.write(b"]" if self._serializer.compact else b"\n]")
+        else:
+            self._file.write(b"[]")
+        self._file.close()
+        return False
+
+
+def compact_text(text: str, line_positions: Optional[List[List[float]]] = None
+                 ) -> Tuple[str, Optional[List[List[float]]]]:
+    """
+    Collapse whitespace in page text and join soft-wrapped lines.
+
+    Runs of spaces become one space, blank lines are dropped, and a line that
+    starts with a lowercase letter is joined to the previous one unless that
+    ends a sentence. The text is processed in a single pass over its lines
+    with str.split, without regular expressions.
+
+    Args:
+        text (str): Page text
+        line_positions (Optional[List[List[float]]]): [offset, top, bottom] of
+            the text lines; lines that are dropped or joined lose their entry
+
+    Returns:
+        Tuple[str, Optional[List[List[float]]]]: The compacted text and the
+        line positions with offsets into it (None if none were given)
+    """
+    lines = []
+    old_starts = []
+    new_starts = []
+    old_offset = new_offset = 0
+
+    for line in text.split("\n"):
+        old_starts.append(old_offset)
+        old_offset += len(line) + 1
+
+        words = line.split()
+        if not words:
+            new_starts.append(None)
+            continue
+
+        compact = " ".join(words)
+        if lines and compact[0].islower() and not lines[-1].endswith((".", "?", "!", ":", ";")):
+            lines[-1] = f"{lines[-1]} {compact}"
+            new_starts.append(None)
+        else:
+            lines.append(compact)
+            new_starts.append(new_offset)
+        new_offset += len(compact) + 1
+
+    if line_positions is None:
+        return "\n".join(lines), None
+
+    positions = []
+    for offset, top, bottom in line_positions:
+        new_start = new_starts[bisect.bisect_right(old_starts, offset) - 1]
+        if new_start is not None:
+            positions.append([new_start, top, bottom])
+
+    return "\n".join(lines), positions
+
+
+def select_pages(page_count: int, pages: Optional[str] = None, sample: Optional[int] = None) -> List[int]:
+    """
+    Turn a page selection into sorted 0-based page indices.
+
+    Args:
+        page_count (int): Number of pages in the document
+        pages (Optional[str]): Comma separated 1-based pages and ranges, e.g.
+            "1-5,20,40-" ("40-" runs to the last page, "-3" from the first);
+            pages past the end of the document are ignored
+        sample (Optional[int]): Keep only this many evenly spaced pages of the
+            selection, always including its first page
+
+    Returns:
+        List[int]: Selected page indices in ascending order
+    """
+    if not pages:
+        selected = list(range(page_count))
+    else:
+        chosen = set()
+        for part in pages.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                if "-" in part:
+                    first, last = part.split("-", 1)
+                    first = int(first) if first.strip() else 1
+                    last = int(last) if last.strip() else page_count
+                else:
+                    first = last = int(part)
+            except ValueError:
+                raise ValueError(f"Invalid page selection: {part!r}")
+            if first < 1 or last < first:
+                raise ValueError(f"Invalid page selection: {part!r}")
+            chosen.update(range(first - 1, min(last, page_count)))
+        selected = sorted(chosen)
+
+    if sample is not None:
+        if sample < 1:
+            raise ValueError(f"Sample size must be positive: {sample}")
+        if sample < len(selected):
+            step = len(selected) / sample
+            selected = [selected[int(i * step)] for i in range(sample)]
+
+    return selected
+
+
+def scan_pdf(pdf_path: str) -> Dict[str, Any]:
+    """
+    Collect page and image metadata without extracting or decoding anything.
+
+    Image sizes come from page.get_image_info(), which reads the image
+    dictionaries only, and the text layer check only measures get_text().
+
+    Args:
+        pdf_path (str): Path to the PDF file
+
+    Returns:
+        Dict: Compact report with page/image counts, image dimensions and
+        whether each page has a text layer
+    """
+    if not PYMUPDF_AVAILABLE:
+        raise ImportError("PyMuPDF is not available. Install with: pip install PyMuPDF")
+
+    with fitz.open(pdf_path) as doc:
+        pages = []
+        for page in doc:
+            text_chars = len(page.get_text().strip())
+            images = [[info["width"], info["height"]] for info in page.get_image_info()]
+            pages.append({
+                "page": page.number + 1,
+                "text_chars": text_chars,
+                "has_text": text_chars > 0,
+                "images": images
+            })
+
+    return {
+        "pdf": pdf_path,
+        "page_count": len(pages),
+        "image_count": sum(len(page["images"]) for page in pages),
+        "text_pages": sum(1 for page in pages if page["has_text"]),
+        "pages": pages
+    }
+
+
+def _scan_pdf_safe(pdf_path: str) -> Dict[str, Any]:
+    """Scan one PDF of a corpus, reporting errors instead of raising."""
+    try:
+        return scan_pdf(pdf_path)
+    except Exception as e:
+        return {"pdf": pdf_path, "error": str(e)}
+
+
+def find_pdfs(pattern: str) -> List[str]:
+    """
+    Resolve a batch input to a sorted list of PDF files.
+
+    Args:
+        pattern (str): A directory (its *.pdf files are used) or a glob pattern
+
+    Returns:
+        List[str]: Paths of the matching PDF files
+    """
+    if os.path.isdir(pattern):
+        return sorted(str(path) for path in Path(pattern).iterdir()
+                      if path.is_file() and path.suffix.lower() == ".pdf")
+
+    return sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+
+def _init_batch_worker(log_file: Optional[str]):
+    """Configure logging once per batch worker process; None logs to stderr only."""
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file))
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+
+# Queue on which a batch worker announces every PDF it starts
+_batch_started = None
+
+
+def _init_batch_pool_worker(log_file: Optional[str], started):
+    """Set up a batch worker that announces its PDFs on the queue `started`."""
+    global _batch_started
+    _batch_started = started
+    _init_batch_worker(log_file)
+
+
+def _process_batch_item(pdf_path: str, output_dir: str, method: str, refresh: bool,
+                        pages: Optional[str], sample: Optional[int],
+                        extractor_options: Dict[str, Any]) -> Dict[str, Any]:
+    """Process one PDF of a batch and report its outcome instead of raising."""
+    if _batch_started is not None:
+        _batch_started.put(output_dir)
+    start = time.perf_counter()
+    result = {"pdf": pdf_path, "output": output_dir, "pages": 0, "questions": 0, "error": None}
+
+    try:
+        extractor = PDFContentExtractor(output_dir=output_dir, **extractor_options)
+        questions = extractor.process_pdf(pdf_path, method=method, refresh=refresh, pages=pages, sample=sample)
+        result["pages"] = len(extractor.extracted_data)
+        result["questions"] = len(questions)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Failed to process {pdf_path}: {e}")
+        result["error"] = str(e)
+
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def process_batch(pdf_paths: List[str], output_dir: str = "extracted_content", method: str = "pymupdf",
+                  jobs: Optional[int] = None, refresh: bool = False, pages: Optional[str] = None,
+                  sample: Optional[int] = None, **extractor_options) -> Dict[str, Any]:
+    """
+    Process many PDFs with a pool of worker processes.
+
+    Each worker imports the PDF libraries and configures logging once and then
+    handles documents one after another. Every PDF gets its own subdirectory of
+    output_dir, named after the file, holding its images and JSON output.
+
+    Args:
+        pdf_paths (List[str]): PDF files to process
+        output_dir (str): Directory receiving one subdirectory per PDF
+        method (str): Extraction method ("pymupdf" or "pdfplumber")
+        jobs (Optional[int]): Number of worker processes; defaults to the CPU count
+        refresh (bool): Ignore cached results
+        pages (Optional[str]): Page selection applied to every PDF
+        sample (Optional[int]): Number of evenly spaced pages to extract per PDF
+        **extractor_options: Further PDFContentExtractor arguments
+
+    Returns:
+        Dict: Batch summary with per-document results, failures and throughput
+    """
+    output_root = Path(output_dir)
+    output_root.mkdir(parents=True, exist_ok=True)
+    log_file = str(output_root / "extraction.log")
+    _init_batch_worker(log_file)
+    logger = logging.getLogger(__name__)
+
+    # Documents with the same file name still get separate subdirectories
+    targets = []
+    used_names = set()
+    for pdf_path in pdf_paths:
+        name = Path(pdf_path).stem
+        suffix = 1
+        while name in used_names:
+            suffix += 1
+            name = f"{Path(pdf_path).stem}_{suffix}"
+        used_names.add(name)
+        targets.append((pdf_path, str(output_root / name)))
+
+    logger.info(f"Starting batch of {len(targets)} PDFs with {jobs or os.cpu_count()} jobs")
+    start = time.perf_counter()
+
+    item_args = (method, refresh, pages, sample, extractor_options)
+    results: Dict[str, Dict[str, Any]] = {}
+    pending = targets
+
+    # A worker that dies (a crash in the PDF library, the OOM killer) breaks
+    # the pool. The PDFs it was running are retried one at a time, so only a
+    # PDF that crashes on its own is reported as failed, and the ones that
+    # never started go to a fresh pool.
+    while pending:
+        finished, running = _run_batch_pool(pending, jobs, log_file, item_args)
+        results.update(finished)
+        unfinished = [target for target in pending if target[1] not in results]
+        if not unfinished:
+            break
+
+        suspects = [target for target in unfinished if target[1] in running] or unfinished
+        logger.warning(f"A batch worker died; retrying {len(suspects)} PDFs one at a time")
+        for pdf_path, target_dir in suspects:
+            isolated, _ = _run_batch_pool([(pdf_path, target_dir)], 1, log_file, item_args)
+            if target_dir not in isolated:
+                logger.error(f"Failed to process {pdf_path}: the worker process died")
+                isolated[target_dir] = {"pdf": pdf_path, "output": target_dir, "pages": 0, "questions": 0,
+                                        "error": "Worker process died", "seconds": 0.0}
+            results.update(isolated)
+
+        pending = [target for target in unfinished if target[1] not in results]
+
+    results = [results[target_dir] for _, target_dir in targets]
+    elapsed = time.perf_counter() - start
+    total_pages = sum(result["pages"] for result in results)
+
+    summary = {
+        "documents": len(results),
+        "succeeded": sum(1 for result in results if not result["error"]),
+        "failed": [{"pdf": result["pdf"], "error": result["error"]} for result in results if result["error"]],
+        "pages": total_pages,
+        "questions": sum(result["questions"] for result in results),
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(total_pages / elapsed, 2) if elapsed > 0 else 0.0,
+        "results": results
+    }
+
+    with open(output_root / "batch_summary.json", 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    logger.info(f"Batch finished: {summary['succeeded']}/{summary['documents']} PDFs, "
+                f"{summary['pages_per_second']} pages/s")
+    return summary
+
+
+def _run_batch_pool(targets: List[Tuple[str, str]], jobs: Optional[int], log_file: str,
+                    item_args: tuple) -> Tuple[Dict[str, Dict[str, Any]], set]:
+    """
+    Run batch items on one process pool.
+
+    Args:
+        targets (List[Tuple[str, str]]): (PDF path, output directory) pairs
+        jobs (Optional[int]): Number of worker processes
+        log_file (str): Log file of the batch
+        item_args (tuple): Further _process_batch_item arguments
+
+    Returns:
+        Tuple[Dict[str, Dict], set]: Results by output directory, and the
+        output directories of the PDFs still running if a worker died
+    """
+    started = multiprocessing.SimpleQueue()
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_pool_worker,
+                             initargs=(log_file, started)) as pool:
+        futures = [(target_dir, pool.submit(_process_batch_item, pdf_path, target_dir, *item_args))
+                   for pdf_path, target_dir in targets]
+        for target_dir, future in futures:
+            try:
+                results[target_dir] = future.result()
+            except BrokenProcessPool:
+                pass
+
+    running = set()
+    while not started.empty():
+        running.add(started.get())
+    started.close()
+
+    return results, running - set(results)
+
+
+def _init_serve_worker(log_file: Optional[str], method: str):
+    """Configure logging and import the extraction backend once per service worker."""
+    _init_batch_worker(log_file)
+    (pdfplumber if method == "pdfplumber" else fitz).load()
+
+
+def _serve_job(pdf_path: Union[str, bytes], output_dir: str, method: str, pages: Optional[str],
+               sample: Optional[int], extractor_options: Dict[str, Any]) -> Dict[str, Any]:
+    """Process one PDF for the extraction service and return its results."""
+    extractor = PDFContentExtractor(output_dir=output_dir, **extractor_options)
+    questions = extractor.process_pdf(pdf_path, method=method, pages=pages, sample=sample)
+
+    result = {
+        "output": output_dir if extractor.output == "disk" else None,
+        "questions": questions,
+        "answer_key": extractor.build_answer_key(questions),
+        "pages": extractor.extracted_data
+    }
+
+    # In memory mode the images travel inside the response, once each
+    if extractor.output == "memory":
+        result["image_data"] = {name: base64.b64encode(data).decode("ascii")
+                                for name, data in extractor.image_data.items()}
+
+    return result
+
+
+class ExtractionService:
+    """
+    Pool of warm extraction worker processes behind an admission limit.
+
+    Workers are started up front and import the extraction backend once, so a
+    request only pays for the extraction itself. At most max_pending jobs are
+    admitted at a time, running or waiting for a worker; callers are expected
+    to refuse further requests rather than queue them without bound. Every
+    job writes its images and JSON output to its own subdirectory, named
+    job_<time>_<random id>; the directory of a failed job is removed, and
+    only the keep_jobs most recent finished ones are kept. When a worker
+    process dies, the jobs it takes down with it fail and the pool is
+    replaced by a freshly started one.
+    """
+
+    def __init__(self, output_dir: str = "extracted_content", method: str = "pymupdf",
+                 workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 max_upload_mb: int = 100, keep_jobs: int = 100, **extractor_options):
+        """
+        Start the worker pool.
+
+        Args:
+            output_dir (str): Directory receiving one subdirectory per job and
+                the log; unused with output="memory"
+            method (str): Default extraction method ("pymupdf" or "pdfplumber")
+            workers (Optional[int]): Worker processes; defaults to the CPU count
+            max_pending (Optional[int]): Jobs admitted at once; defaults to
+                twice the number of workers
+            max_upload_mb (int): Largest PDF accepted as request body
+            keep_jobs (int): Finished job directories kept before the oldest
+                are removed, including those of earlier runs of the service
+            **extractor_options: Further PDFContentExtractor arguments. Job
+                directories are never reused, so a result cache (cache_dir)
+                cannot hit and is best left off
+        """
+        self.output_root = Path(output_dir)
+        self.method = method
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self.max_upload_bytes = max_upload_mb * 1024 * 1024
+        self.keep_jobs = max(0, keep_jobs)
+        self.extractor_options = extractor_options
+        self.serializer = JSONSerializer(extractor_options.get("json_backend", "auto"), compact=True)
+
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = set()
+        self._pool_lock = threading.Lock()
+        self._degraded = False
+        self.pool_restarts = 0
+
+        log_file = None
+        if extractor_options.get("output", "disk") == "disk":
+            self.output_root.mkdir(parents=True, exist_ok=True)
+            log_file = str(self.output_root / "extraction.log")
+        _init_batch_worker(log_file)
+        self.logger = logging.getLogger(__name__)
+        self._log_file = log_file
+
+        self._pool = self._start_pool()
+        self.logger.info(f"Extraction service started with {self.workers} workers")
+
+    def _start_pool(self) -> ProcessPoolExecutor:
+        """Start the worker processes and wait until all of them are ready."""
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_serve_worker,
+                                   initargs=(self._log_file, self.method))
+        # Start every worker now instead of on the first requests
+        for future in [pool.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+        return pool
+
+    def _restart_pool(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """
+        Replace a pool broken by a dead worker, unless another job already did.
+
+        Args:
+            broken (ProcessPoolExecutor): The pool that raised BrokenProcessPool
+
+        Returns:
+            ProcessPoolExecutor: The current, working pool
+        """
+        with self._pool_lock:
+            if self._pool is broken:
+                with self._lock:
+                    self._degraded = True
+                self.logger.error("A worker process died; restarting the worker pool")
+                broken.shutdown(wait=False)
+                self._pool = self._start_pool()
+                with self._lock:
+                    self._degraded = False
+                    self.pool_restarts += 1
+            return self._pool
+
+    def admit(self) -> bool:
+        """
+        Reserve a job slot without waiting.
+
+        Returns:
+            bool: True if the job may run; release() must follow
+        """
+        if not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            self._admitted += 1
+        return True
+
+    def release(self):
+        """Free a job slot reserved by admit()."""
+        with self._lock:
+            self._admitted -= 1
+        self._slots.release()
+
+    def status(self) -> Dict[str, Any]:
+        """Report the pool size, the jobs currently admitted and the pool restarts so far."""
+        with self._lock:
+            return {"status": "degraded" if self._degraded else "ok", "workers": self.workers,
+                    "admitted": self._admitted, "max_pending": self.max_pending,
+                    "pool_restarts": self.pool_restarts}
+
+    def extract(self, pdf_path: Union[str, bytes], method: Optional[str] = None, pages: Optional[str] = None,
+                sample: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Process a PDF on a worker; the caller must hold a slot from admit().
+
+        Args:
+            pdf_path (Union[str, bytes]): Path to the PDF file, as seen by the
+                service, or its contents
+            method (Optional[str]): Extraction method; defaults to the service's
+            pages (Optional[str]): Page selection such as "1-5,20,40-" (1-based)
+            sample (Optional[int]): Only extract this many evenly spaced pages
+
+        Returns:
+            Dict: Output directory, questions, answer key and page data, plus
+            the base64-encoded images by name (image_data) in memory mode
+
+        Raises:
+            RuntimeError: If the worker process died during the job
+        """
+        # Unique across restarts, and sorted by start time
+        job_name = f"job_{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        job_dir = self.output_root / job_name
+        with self._lock:
+            self._running.add(job_name)
+
+        job = (pdf_path, str(job_dir), method or self.method, pages, sample, self.extractor_options)
+        try:
+            pool = self._pool
+            try:
+                future = pool.submit(_serve_job, *job)
+            except BrokenProcessPool:
+                # Broken by an earlier job; this one never reached a worker
+                pool = self._restart_pool(pool)
+                future = pool.submit(_serve_job, *job)
+            try:
+                return future.result()
+            except BrokenProcessPool:
+                self._restart_pool(pool)
+                raise RuntimeError("Worker process died during extraction") from None
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        finally:
+            with self._lock:
+                self._running.discard(job_name)
+            self._prune_jobs()
+
+    def _prune_jobs(self):
+        """Remove the oldest finished job directories beyond keep_jobs."""
+        if not self.output_root.is_dir():
+            return
+        with self._lock:
+            finished = sorted(path for path in self.output_root.glob("job_*")
+                              if path.is_dir() and path.name not in self._running)
+        for path in finished[:max(0, len(finished) - self.keep_jobs)]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def close(self):
+        """Stop the worker pool after the running jobs have finished."""
+        with self._pool_lock:
+            self._pool.shutdown(wait=True)
+
+
+def _service_handler_class():
+    """
+    Build the HTTP request handler of the extraction service.
+
+    http.server is only imported here, as it noticeably slows down the
+    startup of every other command.
+
+    Routes:
+        GET /health: Service status; 503 while the worker pool is restarted
+        POST /extract: Either a JSON body {"pdf_path", "method", "pages",
+            "sample"} naming a file on the server, or the PDF itself with
+            Content-Type application/pdf and the options as query parameters.
+            Responds with the questions, answer key and page data; 503 when
+            the admission limit is reached
+    """
+    import socket
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import urlsplit, parse_qsl
+
+    class ServiceRequestHandler(BaseHTTPRequestHandler):
+        server_version = "PDFContentExtractor"
+        protocol_version = "HTTP/1.1"
+        # Seconds a client may stall while sending a request before it is dropped
+        timeout = 30
+
+        def do_GET(self):
+            if urlsplit(self.path).path != "/health":
+                self._send_json(404, {"error": "Not found"})
+                return
+            status = self.server.service.status()
+            self._send_json(200 if status["status"] == "ok" else 503, status)
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            service = self.server.service
+
+            if url.path != "/extract":
+                self._send_json(404, {"error": "Not found"}, close=True)
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length < 0:
+                    raise ValueError
+            except ValueError:
+                self._send_json(400, {"error": "Invalid Content-Length"}, close=True)
+                return
+            if length > service.max_upload_bytes:
+                self._send_json(413, {"error": "Request body too large"}, close=True)
+                return
+
+            # Read the body before taking a slot, so a slow client cannot hold one
+            try:
+                body = self.rfile.read(length)
+            except socket.timeout:
+                self._send_json(408, {"error": "Request body timed out"}, close=True)
+                return
+            if len(body) < length:
+                self.close_connection = True
+                return
+            if not service.admit():
+                self._send_json(503, {"error": "Too many jobs in progress"})
+                return
+
+            try:
+                params = dict(parse_qsl(url.query))
+                if self.headers.get_content_type() == "application/pdf":
+                    pdf_path = body
+                else:
+                    payload = json.loads(body or b"{}")
+                    if not isinstance(payload, dict):
+                        raise ValueError("Request body must be a JSON object")
+                    params.update(payload)
+                    pdf_path = params.get("pdf_path")
+                    if not pdf_path or not isinstance(pdf_path, str):
+                        raise ValueError("Missing pdf_path")
+
+                sample = params.get("sample")
+                result = service.extract(pdf_path, params.get("method"), params.get("pages"),
+                                         int(sample) if sample else None)
+                self._send_json(200, result)
+
+            except (ValueError, FileNotFoundError) as e:
+                self._send_json(400, {"error": str(e)})
+            except Exception as e:
+                service.logger.error(f"Extraction request failed: {e}")
+                self._send_json(500, {"error": str(e)})
+            finally:
+                service.release()
+
+        def _send_json(self, status: int, data: Dict[str, Any], close: bool = False):
+            body = self.server.service.serializer.dumps(data)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if status == 503:
+                self.send_header("Retry-After", "1")
+            if close:
+                # The request body was not read, so the connection cannot be reused
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Unix socket clients have no address, so the default format fails
+            self.server.service.logger.info(f"{self.command} {self.path}: " + format % args)
+
+    return ServiceRequestHandler
+
+
+def serve(service: ExtractionService, host: str = "127.0.0.1", port: int = 8765,
+          socket_path: Optional[str] = None):
+    """
+    Serve extraction requests over HTTP until interrupted.
+
+    Args:
+        service (ExtractionService): Started extraction service
+        host (str): Interface to listen on
+        port (int): TCP port to listen on
+        socket_path (Optional[str]): Listen on this Unix socket instead of TCP
+    """
+    import socketserver
+    from http.server import ThreadingHTTPServer
+
+    handler = _service_handler_class()
+    if socket_path:
+        class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, handler)
+        address = socket_path
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        address = f"http://{host}:{server.server_address[1]}"
+
+    server.service = service
+    service.logger.info(f"Serving extraction requests on {address}")
+
+    # Stop cleanly on SIGTERM as well as Ctrl+C
+    if threading.current_thread() is threading.main_thread():
+        def stop(signum, frame):
+            raise KeyboardInterrupt
+        signal.signal(signal.SIGTERM, stop)
+    print(f"Serving extraction requests on {address}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def serve_main(argv: List[str]) -> int:
+    """Command-line interface of the `serve` subcommand."""
+    parser = argparse.ArgumentParser(
+        prog="pdf_content_extractor.py serve",
+        description="Serve PDF extraction over HTTP from a pool of warm worker processes"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default: 8765)")
+    parser.add_argument("--socket", help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Warm worker processes (default: CPU count)")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Jobs admitted at once before requests are refused with 503 "
+                             "(default: twice the workers)")
+    parser.add_argument("--max-upload-mb", type=int, default=100,
+                        help="Largest PDF accepted as request body (default: 100)")
+    parser.add_argument("--output", "-o", default="extracted_content",
+                        help="Directory receiving one subdirectory per job (default: extracted_content)")
+    parser.add_argument("--keep-jobs", type=int, default=100,
+                        help="Finished job directories kept before the oldest are removed (default: 100)")
+    parser.add_argument("--method", choices=["pymupdf", "pdfplumber"], default="pymupdf",
+                        help="Default extraction method (default: pymupdf)")
+    parser.add_argument("--image-mode", choices=["png", "raw"], default="png",
+                        help="Save images as PNG or keep their original encoding (default: png)")
+    parser.add_argument("--image-store", help="Content-addressed image directory shared by all jobs")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="Write nothing to disk; responses carry the images base64-encoded "
+                             "in image_data, by the names the pages list in images")
+    args = parser.parse_args(argv)
+
+    if args.in_memory and args.image_store:
+        parser.error("--image-store cannot be combined with --in-memory")
+
+    service = ExtractionService(
+        output_dir=args.output, method=args.method, workers=args.workers,
+        max_pending=args.max_pending, max_upload_mb=args.max_upload_mb, keep_jobs=args.keep_jobs,
+        image_mode=args.image_mode, image_store=args.image_store,
+        output="memory" if args.in_memory else "disk"
+    )
+    serve(service, args.host, args.port, args.socket)
+    return 0
+
+
+def print_import_times():
+    """Print how long each optional backend took to import in this process."""
+    print("\nBackend import times (this process):")
+    for module in (fitz, pdfplumber, Image, orjson, msgspec):
+        if module.load_seconds is not None:
+            print(f"- {module.name}: {module.load_seconds * 1000:.1f} ms")
+        else:
+            print(f"- {module.name}: {'not loaded' if module.available else 'not installed'}")
+    print(f"- Process CPU time: {time.process_time() * 1000:.1f} ms")
+
+
+def main(argv: Optional[List[str]] = None):
+    """Main function with command-line interface."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["serve"]:
+        return serve_main(argv[1:])
+
+    parser = argparse.ArgumentParser(
+        description="PDF Content Extraction Tool for Math Olympiad Papers",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python pdf_extractor.py sample.pdf
+  python pdf_extractor.py sample.pdf --method pdfplumber --output results
+  python pdf_extractor.py sample.pdf --method pymupdf --output /path/to/output
+  python pdf_extractor.py sample.pdf --workers 4
+  python pdf_extractor.py sample.pdf --pages 1-5,20,40-
+  python pdf_extractor.py sample.pdf --sample 10
+  python pdf_extractor.py papers/ --jobs 8
+  python pdf_extractor.py "papers/**/*.pdf" --jobs 8
+  python pdf_extractor.py papers/ --scan > scan_report.jsonl
+  python pdf_extractor.py serve --port 8765 --workers 4
+        """
+    )
+
+    parser.add_argument(
+        "pdf_path",
+        help="Path to the PDF file to process, or a directory/glob pattern for batch mode"
+    )
+
+    parser.add_argument(
+        "--method",
+        choices=["pymupdf", "pdfplumber"],
+        default="pymupdf",
+        help="PDF extraction method (default: pymupdf)"
+    )
+
+    parser.add_argument(
+        "--output",
+        default="extracted_content",
+        help="Output directory for results (default: extracted_content)"
+    )
+
+    parser.add_argument(
+        "--pages",
+        default=None,
+        help="Pages to extract, e.g. 1-5,20,40- (default: all pages)"
+    )
+
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=None,
+        help="Extract only N evenly spaced pages of the selection"
+    )
+
+    parser.add_argument(
+        "--format",
+        choices=["json", "jsonl"],
+        default="json",
+        help="Write questions and pages as JSON arrays or JSON Lines (default: json)"
+    )
+
+    parser.add_argument(
+        "--flush-every",
+        type=int,
+        default=1,
+        help="Flush JSON Lines output after this many records (default: 1)"
+    )
+
+    parser.add_argument(
+        "--json-backend",
+        choices=list(JSONSerializer.BACKENDS),
+        default="auto",
+        help="JSON library for the output files (default: auto, the fastest installed)"
+    )
+
+    parser.add_argument(
+        "--compact-json",
+        action="store_true",
+        help="Write JSON without indentation"
+    )
+
+    parser.add_argument(
+        "--image-store",
+        help="Content-addressed image directory shared between runs; images are "
+             "stored once by hash instead of per output directory (PyMuPDF only)"
+    )
+
+    parser.add_argument(
+        "--image-mode",
+        choices=["png", "raw"],
+        default="png",
+        help="Save images as PNG or keep their original encoding (default: png)"
+    )
+
+    parser.add_argument(
+        "--image-writers",
+        type=int,
+        default=2,
+        help="Background threads writing images to disk, 0 to write inline (default: 2)"
+    )
+
+    parser.add_argument(
+        "--write-queue-depth",
+        type=int,
+        default=16,
+        help="Maximum encoded images waiting to be written (default: 16)"
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes for page-parallel PyMuPDF extraction (default: 1)"
+    )
+
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Worker processes for batch mode, one PDF per worker at a time (default: CPU count)"
+    )
+
+    parser.add_argument(
+        "--scan",
+        action="store_true",
+        help="Only report page/image counts, image sizes and text layers as one JSON line per PDF"
+    )
+
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream pages through parsing and saving to bound memory use"
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse unchanged pages from the previous run in the output directory (PyMuPDF only)"
+    )
+
+    parser.add_argument(
+        "--strip-repeated",
+        action="store_true",
+        help="Drop headers, footers and watermarks repeated across pages (PyMuPDF only)"
+    )
+
+    parser.add_argument(
+        "--compact-text",
+        action="store_true",
+        help="Collapse whitespace and join soft-wrapped lines in the page text"
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Directory of the persistent result cache (default: ~/.cache/pdf_content_extractor)"
+    )
+
+    parser.add_argument(
+        "--cache-size-mb",
+        type=int,
+        default=512,
+        help="Result cache size limit in MB before LRU eviction (default: 512)"
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the result cache"
+    )
+
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Re-extract even if a cached result exists, then update the cache"
+    )
+
+    parser.add_argument(
+        "--import-time",
+        action="store_true",
+        help="Report the import time of every backend loaded during the run"
+    )
+
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Enable verbose logging"
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.import_time:
+        atexit.register(print_import_times)
+
+    # Check library availability
+    if args.scan:
+        if not PYMUPDF_AVAILABLE:
+            print("Error: PyMuPDF is not installed. Install with: pip install PyMuPDF")
+            return 1
+
+        batch = os.path.isdir(args.pdf_path) or glob.has_magic(args.pdf_path)
+        pdf_paths = find_pdfs(args.pdf_path) if batch else [args.pdf_path]
+
+        if len(pdf_paths) > 1 and args.jobs != 1:
+            with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+                reports = pool.map(_scan_pdf_safe, pdf_paths, chunksize=8)
+                for report in reports:
+                    print(json.dumps(report, separators=(",", ":"), ensure_ascii=False))
+        else:
+            for pdf_path in pdf_paths:
+                print(json.dumps(_scan_pdf_safe(pdf_path), separators=(",", ":"), ensure_ascii=False))
+
+        return 0
+
+    if args.method == "pymupdf" and not PYMUPDF_AVAILABLE:
+        print("Error: PyMuPDF is not installed. Install with: pip install PyMuPDF")
+        return 1
+
+    if args.method == "pdfplumber" and not PDFPLUMBER_AVAILABLE:
+        print("Error: pdfplumber is not installed. Install with: pip install pdfplumber")
+        return 1
+
+    if not PILLOW_AVAILABLE:
+        print("Warning: Pillow is not installed. Image processing may be limited.")
+
+    extractor_options = {
+        "image_mode": args.image_mode,
+        "image_writers": args.image_writers,
+        "write_queue_depth": args.write_queue_depth,
+        # Streaming never reads or writes the result cache
+        "cache_dir": None if args.no_cache or args.stream else
+                     args.cache_dir or os.path.join("~", ".cache", "pdf_content_extractor"),
+        "cache_size_mb": args.cache_size_mb,
+        "incremental": args.incremental,
+        "strip_repeated": args.strip_repeated,
+        "compact_text": args.compact_text,
+        "output_format": args.format,
+        "flush_every": args.flush_every,
+        "json_backend": args.json_backend,
+        "compact_json": args.compact_json,
+        "image_store": args.image_store
+    }
+
+    if args.stream and (args.incremental or args.workers > 1):
+        print("Error: --stream cannot be combined with --incremental or --workers")
+        return 1
+
+    if args.stream and (args.cache_dir or args.refresh):
+        print("Error: --stream does not use the result cache; drop --cache-dir and --refresh")
+        return 1
+
+    if os.path.isdir(args.pdf_path) or glob.has_magic(args.pdf_path):
+        if args.stream:
+            print("Error: --stream is not supported in batch mode")
+            return 1
+        if args.workers > 1:
+            print("Error: --workers is not supported in batch mode; use --jobs")
+            return 1
+
+        pdf_paths = find_pdfs(args.pdf_path)
+        if not pdf_paths:
+            print(f"Error: No PDF files found for: {args.pdf_path}")
+            return 1
+
+        summary = process_batch(pdf_paths, output_dir=args.output, method=args.method, jobs=args.jobs,
+                                refresh=args.refresh, pages=args.pages, sample=args.sample,
+                                **extractor_options)
+
+        print(f"\nBatch completed!")
+        print(f"- Documents processed: {summary['succeeded']}/{summary['documents']}")
+        print(f"- Total pages: {summary['pages']}")
+        print(f"- Throughput: {summary['pages_per_second']} pages/s")
+        print(f"- Output directory: {args.output}")
+        for failure in summary["failed"]:
+            print(f"- Failed: {failure['pdf']}: {failure['error']}")
+
+        return 1 if summary["failed"] else 0
 
     try:
     
-        extractor = PDFContentExtractor(output_dir=args.output)
-        questions = extractor.process_pdf(args.pdf_path, method=args.method)
+        extractor = PDFContentExtractor(output_dir=args.output, **extractor_options)
+        if args.stream:
+            question_count = extractor.process_pdf_streaming(args.pdf_path, method=args.method,
+                                                             pages=args.pages, sample=args.sample)
+        else:
+            questions = extractor.process_pdf(args.pdf_path, method=args.method, workers=args.workers,
+                                              refresh=args.refresh, pages=args.pages, sample=args.sample)
+            question_count = len(questions)
 
         
         print(f"\nExtraction completed successfully!")
-        print(f"- Total questions found: {len(questions)}")
+        print(f"- Total questions found: {question_count}")
         print(f"- Output directory: {args.output}")
         print(f"- Method used: {args.method}")
+        if extractor.text_bytes_saved:
+            print(f"- Text compaction saved: {extractor.text_bytes_saved} bytes")
 
         return 0
 
@@ -0,0 +1,385 @@
+
+
+import http.client
+import io
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import pdf_content_extractor
+from pdf_content_extractor import PDFContentExtractor, QuestionParser, RepeatedContent, compact_text, select_pages
+
+@pytest.fixture
+def pymupdf():
+    return pytest.importorskip("pymupdf")
+
+def write_pdf(pymupdf, path, texts, form=False, images=False):
+    """
+    Write a PDF with one page per text, drawn through a Form XObject if form
+    is set, and with a distinct image below the text of each page if images is.
+    """
+    doc = pymupdf.open()
+    for index, text in enumerate(texts):
+        page = doc.new_page()
+        if form:
+            source = pymupdf.open()
+            source.new_page().insert_text((72, 72), text)
+            page.show_pdf_page(page.rect, source, 0)
+        else:
+            page.insert_text((72, 72), text)
+        if images:
+            pix = pymupdf.Pixmap(pymupdf.csRGB, pymupdf.IRect(0, 0, 8, 8), 0)
+            pix.clear_with(40 + 20 * index)
+            page.insert_image(pymupdf.Rect(72, 200, 172, 300), pixmap=pix)
+    doc.save(str(path))
+    return str(path)
+
+def parse(*texts):
+    """Parse page texts without layout and return the questions as dicts."""
+    pages = [{"page_number": i, "text": text, "images": []} for i, text in enumerate(texts, 1)]
+    return [record.to_dict() for record in QuestionParser().parse(pages)]
+
+def test_parser_reads_stem_options_and_answer():
+    questions = parse("1. What is a?\n[A] one [B] two\n[C] three\n[D] four\nAns [B]")
+
+    assert len(questions) == 1
+    assert questions[0]["number"] == 1
+    assert questions[0]["question"] == "1. What is a?"
+    assert [option["label"] for option in questions[0]["options"]] == ["A", "B", "C", "D"]
+    assert questions[0]["options"][1]["text"] == "two"
+    assert questions[0]["answer"] == "B"
+
+@pytest.mark.parametrize("line", ["Ans [B]", "Ans. [B]", "ans [ B ]", "Ans: B", "Ans (B)", "Ans - B", "Ans.: B"])
+def test_parser_reads_answer_forms(line):
+    assert parse(f"1. What is a?\n{line}")[0]["answer"] == "B"
+
+def test_parser_warns_about_answer_lines_without_a_label(caplog):
+    questions = parse("1. What is a?\nAns see below")
+
+    assert questions[0]["answer"] == ""
+    assert "No answer label" in caplog.text
+
+def test_parser_drops_text_between_questions():
+    questions = parse("SECTION-A\n1. What is a?\nAns [A]\nA diagram label\n2. What is b?\nAns. [C]")
+
+    assert [question["question"] for question in questions] == ["1. What is a?", "2. What is b?"]
+    assert [question["answer"] for question in questions] == ["A", "C"]
+
+def test_parser_accepts_restarted_numbering_after_a_closed_question():
+    questions = parse("1. What is a?\nAns [A]\n2. What is b?\nAns [B]\nSECTION-B\n1. What is c?\nAns [C]")
+
+    assert [question["number"] for question in questions] == [1, 2, 1]
+    assert questions[2]["question"] == "1. What is c?"
+
+def test_answer_key_keeps_restarted_numbers_apart():
+    questions = parse("1. What is a?\nAns [A]\n2. What is b?\nAns [B]\nSECTION-B\n1. What is c?\nAns [C]")
+
+    assert PDFContentExtractor.build_answer_key(questions) == {"1": "A", "2": "B", "1#2": "C"}
+
+def test_parser_keeps_lower_numbers_inside_an_open_question():
+    questions = parse("5. Which step is wrong?\n2. subtract 3\n[A] first [B] second\nAns [A]")
+
+    assert len(questions) == 1
+    assert questions[0]["question"] == "5. Which step is wrong? 2. subtract 3"
+
+def test_parser_continues_a_question_across_pages():
+    questions = parse("1. What is the sum of\n[A] 1 [B] 2", "2\n[C] 3 [D] 4\nAns [D]")
+
+    assert len(questions) == 1
+    assert [option["text"] for option in questions[0]["options"]] == ["1", "2", "3", "4"]
+    assert questions[0]["answer"] == "D"
+
+def test_select_pages_ranges_and_sample():
+    assert select_pages(10) == list(range(10))
+    assert select_pages(10, "1-3,5,8-") == [0, 1, 2, 4, 7, 8, 9]
+    assert select_pages(10, "-2,9-20") == [0, 1, 8, 9]
+    assert select_pages(10, sample=3) == [0, 3, 6]
+    assert select_pages(10, "6-", sample=10) == [5, 6, 7, 8, 9]
+
+@pytest.mark.parametrize("pages", ["0", "5-3", "a-b"])
+def test_select_pages_rejects_invalid_selections(pages):
+    with pytest.raises(ValueError):
+        select_pages(10, pages)
+
+def test_compact_text_collapses_blanks_and_joins_wrapped_lines():
+    text = "Hello   world\n\nthis  wraps\nNext."
+    positions = [[0, 10, 20], [15, 30, 40], [27, 50, 60]]
+
+    compacted, new_positions = compact_text(text, positions)
+
+    assert compacted == "Hello world this wraps\nNext."
+    assert new_positions == [[0, 10, 20], [23, 50, 60]]
+    assert compact_text(text) == (compacted, None)
+
+def test_strip_text_drops_repeated_lines_and_remaps_positions():
+    repeats = RepeatedContent(lines=[(0, "Header #"), (-1, "Page #")])
+    text = "Header 3\n1. Q?\nAns [A]\nPage 3"
+    positions = [[0, 1, 2], [9, 3, 4], [15, 5, 6], [23, 7, 8]]
+
+    stripped, new_positions = repeats.strip_text(text, positions)
+
+    assert stripped == "1. Q?\nAns [A]"
+    assert new_positions == [[0, 3, 4], [6, 5, 6]]
+
+def test_strip_text_keeps_question_lines():
+    repeats = RepeatedContent(lines=[(0, "#. Q?")])
+
+    assert repeats.strip_text("1. Q?\nAns [A]", [])[0] == "1. Q?\nAns [A]"
+
+def test_parser_keeps_every_question_image():
+    page = {
+        "page_number": 1,
+        "text": "1. Q?\n[A] x [B] y\nAns [A]",
+        "images": ["fig1.png", "fig2.png", "option.png"],
+        "page_size": [600, 800],
+        "image_bboxes": [[10, 120, 50, 160], [60, 120, 100, 160], [10, 400, 50, 440]],
+        "text_lines": [[0, 100, 110], [6, 300, 310], [18, 320, 330]]
+    }
+
+    question = next(QuestionParser().parse([page])).to_dict()
+
+    assert question["images"] == "fig1.png"
+    assert question["question_images"] == ["fig1.png", "fig2.png"]
+    assert question["option_images"] == ["option.png"]
+
+def test_image_bboxes_match_each_image(pymupdf):
+    doc = pymupdf.open()
+    page = doc.new_page()
+    rects = [pymupdf.Rect(10, 10, 60, 60), pymupdf.Rect(100, 10, 150, 60), pymupdf.Rect(10, 200, 90, 240)]
+    for rect, (width, shade) in zip(rects, [(8, 40), (8, 120), (16, 200)]):
+        pix = pymupdf.Pixmap(pymupdf.csRGB, pymupdf.IRect(0, 0, width, 8), 0)
+        pix.clear_with(shade)
+        page.insert_image(rect, pixmap=pix)
+
+    boxes = PDFContentExtractor._image_bboxes(page, page.get_images(full=True))
+
+    assert sorted(boxes) == sorted([list(rect) for rect in rects])
+
+def test_incremental_fingerprint_covers_form_xobjects(tmp_path, pymupdf):
+    first = write_pdf(pymupdf, tmp_path / "a.pdf", ["1. What is Alpha?\nAns [A]"], form=True)
+    second = write_pdf(pymupdf, tmp_path / "b.pdf", ["1. What is Bravo?\nAns [A]"], form=True)
+    extractor = PDFContentExtractor(output_dir=str(tmp_path / "out"), incremental=True)
+
+    extractor.process_pdf(first)
+    questions = extractor.process_pdf(second)
+
+    assert questions[0]["question"] == "1. What is Bravo?"
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="workers must inherit the patch")
+def test_batch_survives_a_worker_crash(tmp_path, pymupdf, monkeypatch):
+    pdf_paths = [write_pdf(pymupdf, tmp_path / f"{name}.pdf", ["1. Q?\nAns [A]"]) for name in ("a", "crash", "b", "c")]
+    process_pdf = PDFContentExtractor.process_pdf
+
+    def crash_on_request(self, pdf_path, *args, **kwargs):
+        if "crash" in pdf_path:
+            os.kill(os.getpid(), signal.SIGKILL)
+        return process_pdf(self, pdf_path, *args, **kwargs)
+
+    monkeypatch.setattr(PDFContentExtractor, "process_pdf", crash_on_request)
+    summary = pdf_content_extractor.process_batch(pdf_paths, output_dir=str(tmp_path / "out"), jobs=2)
+
+    assert summary["succeeded"] == 3
+    assert [failure["pdf"] for failure in summary["failed"]] == [pdf_paths[1]]
+    assert [result["pdf"] for result in summary["results"]] == pdf_paths
+    assert (tmp_path / "out" / "batch_summary.json").exists()
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="workers must inherit the patch")
+def test_service_restarts_its_pool_after_a_worker_crash(tmp_path, pymupdf, monkeypatch):
+    good = write_pdf(pymupdf, tmp_path / "good.pdf", ["1. Q?\nAns [A]"])
+    crash = write_pdf(pymupdf, tmp_path / "crash.pdf", ["1. Q?\nAns [A]"])
+    process_pdf = PDFContentExtractor.process_pdf
+
+    def crash_on_request(self, pdf_path, *args, **kwargs):
+        if "crash" in pdf_path:
+            os.kill(os.getpid(), signal.SIGKILL)
+        return process_pdf(self, pdf_path, *args, **kwargs)
+
+    monkeypatch.setattr(PDFContentExtractor, "process_pdf", crash_on_request)
+    service = pdf_content_extractor.ExtractionService(output_dir=str(tmp_path / "out"), workers=1)
+    try:
+        with pytest.raises(RuntimeError):
+            service.extract(crash)
+        result = service.extract(good)
+    finally:
+        service.close()
+
+    assert result["answer_key"] == {"1": "A"}
+    assert service.status()["status"] == "ok"
+    assert service.status()["pool_restarts"] == 1
+
+@pytest.fixture
+def service_server(tmp_path, pymupdf):
+    """Serve a one-worker ExtractionService on a free port; yields the server."""
+    service = pdf_content_extractor.ExtractionService(output_dir=str(tmp_path / "out"), workers=1,
+                                                      max_pending=1, max_upload_mb=1)
+    handler = pdf_content_extractor._service_handler_class()
+    handler.timeout = 0.5
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.service = service
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+def post(server, body, headers):
+    """POST body to the server's /extract and return the status and JSON reply."""
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    connection.putrequest("POST", "/extract")
+    for name, value in headers.items():
+        connection.putheader(name, value)
+    connection.endheaders(body)
+    response = connection.getresponse()
+    reply = (response.status, json.loads(response.read()))
+    connection.close()
+    return reply
+
+def test_service_extracts_an_uploaded_pdf(tmp_path, pymupdf, service_server):
+    body = open(write_pdf(pymupdf, tmp_path / "a.pdf", ["1. Q?\nAns [C]"]), "rb").read()
+
+    status, reply = post(service_server, body, {"Content-Type": "application/pdf", "Content-Length": str(len(body))})
+
+    assert status == 200
+    assert reply["answer_key"] == {"1": "C"}
+
+@pytest.mark.parametrize("length, body, status", [
+    ("-1", b"", 400),
+    ("abc", b"", 400),
+    ("2", b"{}", 400),
+    (str(2 * 1024 * 1024), b"", 413),
+])
+def test_service_rejects_bad_requests(service_server, length, body, status):
+    assert post(service_server, body, {"Content-Length": length})[0] == status
+
+def test_service_refuses_jobs_beyond_max_pending(service_server):
+    body = b'{"pdf_path": "missing.pdf"}'
+    assert service_server.service.admit()
+    try:
+        status = post(service_server, body, {"Content-Length": str(len(body))})[0]
+    finally:
+        service_server.service.release()
+
+    assert status == 503
+    assert post(service_server, body, {"Content-Length": str(len(body))})[0] == 400
+
+def test_service_does_not_hold_a_slot_for_a_stalled_upload(service_server):
+    with socket.create_connection(service_server.server_address) as client:
+        client.sendall(b"POST /extract HTTP/1.1\r\nContent-Length: 100\r\n\r\n")
+        assert service_server.service.status()["admitted"] == 0
+        assert client.recv(1024).startswith(b"HTTP/1.1 408")
+
+def without_paths(page_data):
+    """Page data with image paths reduced to file names, to compare output directories."""
+    return [dict(page, images=[os.path.basename(image) for image in page["images"]]) for page in page_data]
+
+def test_parallel_extraction_matches_serial(tmp_path, pymupdf):
+    texts = [f"{number}. Question {number}?\n[A] x [B] y\nAns [B]" for number in range(1, 7)]
+    pdf_path = write_pdf(pymupdf, tmp_path / "a.pdf", texts, images=True)
+    serial = PDFContentExtractor(output_dir=str(tmp_path / "serial"))
+    parallel = PDFContentExtractor(output_dir=str(tmp_path / "parallel"))
+
+    serial_questions = serial.process_pdf(pdf_path)
+    parallel_questions = parallel.process_pdf(pdf_path, workers=3)
+
+    assert len(serial_questions) == 6
+    assert without_paths(parallel.extracted_data) == without_paths(serial.extracted_data)
+    assert [question["answer"] for question in parallel_questions] == ["B"] * 6
+    assert sorted(os.listdir(tmp_path / "parallel" / "images")) == sorted(os.listdir(tmp_path / "serial" / "images"))
+
+def test_cache_hit_requires_the_images_it_refers_to(tmp_path, pymupdf, caplog):
+    caplog.set_level(logging.INFO)
+    pdf_path = write_pdf(pymupdf, tmp_path / "a.pdf", ["1. Q?\nAns [A]"], images=True)
+    extractor = PDFContentExtractor(output_dir=str(tmp_path / "out"), cache_dir=str(tmp_path / "cache"))
+    extractor.process_pdf(pdf_path)
+    image = extractor.extracted_data[0]["images"][0]
+    original = open(image, "rb").read()
+
+    caplog.clear()
+    extractor.process_pdf(pdf_path)
+    assert "Loaded cached extraction" in caplog.text
+
+    # Another document extracted into the same directory replaces the file
+    with open(image, "wb") as f:
+        f.write(b"not this document's image")
+    caplog.clear()
+    extractor.process_pdf(pdf_path)
+
+    assert "Loaded cached extraction" not in caplog.text
+    assert open(image, "rb").read() == original
+
+def test_incremental_run_reuses_unchanged_pages_only(tmp_path, pymupdf, caplog):
+    caplog.set_level(logging.INFO)
+    texts = [f"{number}. Question {number}?\nAns [A]" for number in range(1, 4)]
+    first = write_pdf(pymupdf, tmp_path / "a.pdf", texts, images=True)
+    second = write_pdf(pymupdf, tmp_path / "b.pdf", [texts[0], "2. Revised?\nAns [C]", texts[2]], images=True)
+    extractor = PDFContentExtractor(output_dir=str(tmp_path / "out"), incremental=True)
+    extractor.process_pdf(first)
+
+    caplog.clear()
+    questions = extractor.process_pdf(second)
+    assert "Reused 2 of 3 pages" in caplog.text
+    assert [question["answer"] for question in questions] == ["A", "C", "A"]
+    assert questions[1]["question"] == "2. Revised?"
+
+    image = extractor.extracted_data[0]["images"][0]
+    original = open(image, "rb").read()
+    with open(image, "wb") as f:
+        f.write(b"not this page's image")
+    caplog.clear()
+    extractor.process_pdf(second)
+
+    assert "Ignoring 1 manifest pages" in caplog.text
+    assert "Reused 2 of 3 pages" in caplog.text
+    assert open(image, "rb").read() == original
+
+def test_image_store_ignores_temporary_files(tmp_path, pymupdf):
+    pdf_path = write_pdf(pymupdf, tmp_path / "a.pdf", ["1. Q?\nAns [A]"], images=True)
+    extractor = PDFContentExtractor(output_dir=str(tmp_path / "out"), image_mode="raw",
+                                    image_store=str(tmp_path / "store"))
+    extractor.process_pdf(pdf_path)
+    stored = extractor.extracted_data[0]["images"][0]
+    assert not list((tmp_path / "store").rglob("*.tmp"))
+
+    # Leftover of a write that was interrupted before the rename
+    os.replace(stored, stored + ".tmp")
+    extractor.process_pdf(pdf_path)
+
+    assert extractor.extracted_data[0]["images"] == [stored]
+    assert os.path.exists(stored)
+
+@pytest.mark.parametrize("wrap", [bytes, memoryview, io.BytesIO])
+def test_process_pdf_accepts_pdf_contents(tmp_path, pymupdf, wrap):
+    pdf_path = write_pdf(pymupdf, tmp_path / "a.pdf", ["1. Q?\nAns [D]", "2. R?\nAns [B]"], images=True)
+    from_path = PDFContentExtractor(output_dir=str(tmp_path / "path"))
+    from_contents = PDFContentExtractor(output_dir=str(tmp_path / "contents"))
+    with open(pdf_path, "rb") as f:
+        contents = f.read()
+
+    expected = from_path.process_pdf(pdf_path)
+    questions = from_contents.process_pdf(wrap(contents))
+
+    assert [question["answer"] for question in questions] == ["D", "B"]
+    assert [question["question"] for question in questions] == [question["question"] for question in expected]
+    assert without_paths(from_contents.extracted_data) == without_paths(from_path.extracted_data)
+
+def test_memory_output_writes_nothing(tmp_path, pymupdf, monkeypatch):
+    pdf_path = write_pdf(pymupdf, tmp_path / "a.pdf", ["1. Q?\nAns [A]", "2. R?\nAns [B]"], images=True)
+    monkeypatch.chdir(tmp_path)
+    extractor = PDFContentExtractor(output_dir=str(tmp_path / "out"), output="memory")
+
+    questions = extractor.process_pdf(pdf_path)
+    streamed = list(extractor.iter_pages(pdf_path))
+
+    assert os.listdir(tmp_path) == ["a.pdf"]
+    assert [question["answer"] for question in questions] == ["A", "B"]
+    names = [name for page in extractor.extracted_data + streamed for name in page["images"]]
+    assert len(names) == 4
+    assert all(extractor.image_data[name].startswith(b"\x89PNG") for name in names)